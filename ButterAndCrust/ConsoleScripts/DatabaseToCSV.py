@@ -2,25 +2,77 @@ import datetime as dt
 import argparse
 
 import ButterAndCrust.lib.PackageConfig as PC
-from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import CompressedOrderHistory
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, sqlCompressedOrderHistory, mirrorCompressedOrderHistory, tieredCompressedOrderHistory
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata, ARCHIVE_WATERMARK_KEY
 
 def main():
     parser = argparse.ArgumentParser(description="Produce csv file of DB")
     parser.add_argument("-date", help="delivery date of orders YYYY/mm/dd", type=lambda s: dt.datetime.strptime(s, '%Y/%m/%d'), required=False)
+    parser.add_argument("-offline", help="only export orders archived in cold storage, without airtable", action="store_true")
     args = parser.parse_args()
 
-    table = CompressedOrderHistory(PC.ORDERS_DB_LOC)
+    # the reporting connection is read only, so create the cold table
+    # and its indices first
+    sqlCompressedOrderHistory(PC.COLD_STORAGE_ORDERS_DB_LOC).create_table()
+    cold_table = sqlCompressedOrderHistory(PC.COLD_STORAGE_ORDERS_DB_LOC, profile='reporting')
 
     if args.date:
-        df = table.select_by_delivery_date(args.date,
-                                           args.date + dt.timedelta(days=1))
+        start_date, end_date = args.date, args.date + dt.timedelta(days=1)
         filename = "CompressedOrderHistory_{}.csv".format(args.date.strftime("%Y%m%d"))
 
     else:
-        df = table.select()
+        start_date, end_date = dt.datetime.min, dt.datetime.max
         filename = "CompressedOrderHistory_All.csv"
 
-    df.to_csv(PC.DEFAULT_OUTPUT_LOCATION + filename)
+    # airtable is only needed for orders that haven't been archived yet
+    hot_table = None
+    if not args.offline and reaches_hot(cold_table, end_date):
+        order_airtable = airCompressedOrderHistory(PC.base_key, PC.api_key)
+        hot_table = mirrorCompressedOrderHistory(order_airtable, PC.MIRROR_DB_LOC)
+
+    table = tieredCompressedOrderHistory(hot_table, cold_table)
+    chunks = table.iter_by_delivery_date(start_date, end_date)
+
+    write_csv(chunks, PC.DEFAULT_OUTPUT_LOCATION + filename)
+
+def reaches_hot(cold, end_date):
+    """
+    Checks whether orders delivered before end_date may still be in the
+    hot table, i.e. end_date is past the archive watermark
+
+    Args:
+        cold(``sqlCompressedOrderHistory``): cold storage table
+        end_date(``datetime``): end date of the export (exclusive)
+
+    Returns:
+        (``bool``): True if the hot table has to be read
+    """
+    watermark = sqlMetadata(cold.db_file).get(ARCHIVE_WATERMARK_KEY)
+
+    return watermark is None or end_date > dt.datetime.fromisoformat(watermark)
+
+def write_csv(chunks, path):
+    """
+    Writes DataFrame chunks to a single csv file as they arrive, so only
+    one chunk is held in memory at a time.
+
+    Args:
+        chunks(``iterable of DataFrame``): chunks to write, in order
+        path(``str``): filepath of the csv
+
+    Returns:
+        (``int``): number of rows written
+    """
+    num_rows = 0
+
+    with open(path, "w", newline="") as f:
+        for df in chunks:
+            # number rows across chunks as a single DataFrame would be
+            df.index = range(num_rows, num_rows + len(df))
+            df.to_csv(f, header=(f.tell() == 0))
+            num_rows += len(df)
+
+    return num_rows
 
 if __name__ == "__main__":
     main()
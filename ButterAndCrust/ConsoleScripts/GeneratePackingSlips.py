@@ -5,24 +5,38 @@ import ButterAndCrust.lib.PackageConfig as PC
 from ButterAndCrust.lib.templates.main.StandardHTMLTemplate import template as html_template
 import ButterAndCrust.lib.General.Exceptions as e
 from ButterAndCrust.lib.PackingSlipManager import PackingSlipManager
-from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory
+from ButterAndCrust.lib.PackingSlipCache import PackingSlipCache
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, mirrorCompressedOrderHistory
 
 def main():
     parser = argparse.ArgumentParser(description="Produce B&C packing slips")
     parser.add_argument("-date", help="delivery date of orders YYYY/mm/dd", type=str, required=True)
     parser.add_argument("-file", help="file containing route order information", type=str, required=False)
+    parser.add_argument("-chunksize", help="max number of packing slips per pdf, each pdf holds a single route", type=int, default=PackingSlipManager.SLIPS_PER_PDF)
+    parser.add_argument("-workers", help="max number of pdfs to render at once", type=int, required=False)
+    parser.add_argument("-nocache", help="render every pdf, ignoring previously rendered pdfs", action="store_true")
     args = parser.parse_args()
 
     routes_file = args.file
     delivery_date = check_input_date(args.date)
     outfile_format = PC.DEFAULT_OUTPUT_LOCATION + "PackingSlips_{date}".format(date=delivery_date.strftime("%Y%m%d"))
 
-    packing_slip_manager = PackingSlipManager(outfile_format, PC.WORKING_DIRECTORY,
-                                              html_template, PC.PATH_WKHTMLTOPDF)
+    cache = None if args.nocache else PackingSlipCache(PC.PACKING_SLIP_CACHE_DIR)
+
+    packing_slip_manager = PackingSlipManager(outfile_format, html_template,
+                                              PC.PATH_WKHTMLTOPDF,
+                                              slips_per_pdf=args.chunksize,
+                                              max_workers=args.workers,
+                                              wkhtml_options=PC.WKHTMLTOPDF_OPTIONS,
+                                              cache=cache)
     
-    order_table = airCompressedOrderHistory(PC.base_key, PC.api_key)
+    order_airtable = airCompressedOrderHistory(PC.base_key, PC.api_key)
+    order_table = mirrorCompressedOrderHistory(order_airtable, PC.MIRROR_DB_LOC)
     packing_slip_manager.produce_packing_slips(delivery_date, routes_file, order_table)
 
+    if cache is not None:
+        cache.prune()
+
 def check_input_date(datestr):
     """
     Warns user if the input date is a Saturday and asks if would like to
@@ -3,22 +3,26 @@ import datetime as dt
 
 import ButterAndCrust.lib.PackageConfig as PC
 from ButterAndCrust.lib.OrderProcessor import OrderProcessor
-from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, sqlCompressedOrderHistory
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, sqlCompressedOrderHistory, mirrorCompressedOrderHistory
 from ButterAndCrust.ConsoleScripts.RebuildBody import rebuild_body
 
 def main():
     parser = argparse.ArgumentParser(description="Process B&C Weekly Orders")
     parser.add_argument("-file", help="location of weekly orders csv file", type=str, required=True)
     parser.add_argument("-date", help="delivery date of input orders YYYY/mm/dd", type=str, required=True)
+    parser.add_argument("-chunksize", help="stream the orders csv this many rows at a time", type=int, required=False)
+    parser.add_argument("-batchsize", help="sync compressed orders to the order history this many orders at a time, defaults to 10000 with -chunksize", type=int, required=False)
     args = parser.parse_args()
     
     d = args.date.replace("/","")
 
     outfile = PC.DEFAULT_OUTPUT_LOCATION + "/RequiredStock_{}.csv".format(d)
     order_airtable = airCompressedOrderHistory(PC.base_key, PC.api_key)
+    order_table = mirrorCompressedOrderHistory(order_airtable, PC.MIRROR_DB_LOC)
     
-    order_processor = OrderProcessor(args.file, args.date, order_airtable)
-    order_processor.process_orders(outfile)    
+    order_processor = OrderProcessor(args.file, args.date, order_table)
+    order_processor.process_orders(outfile, chunksize=args.chunksize,
+                                   batch_size=args.batchsize)
 
         
 
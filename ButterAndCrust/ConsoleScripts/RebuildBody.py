@@ -1,22 +1,53 @@
 import argparse
 import datetime as dt
+import hashlib
 import json
 
 import ButterAndCrust.lib.PackageConfig as PC
 from ButterAndCrust.lib.OrderProcessor import OrderProcessor
 from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, sqlCompressedOrderHistory
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata, ARCHIVE_WATERMARK_KEY
+
+# number of records synced, verified and deleted together
+ARCHIVE_BATCH_SIZE = 500
+
+# PRAGMA synchronous of FULL, every commit is synced to disk
+SYNCHRONOUS_FULL = 2
+
+class ArchiveChecksumError(RuntimeError):
+    """
+    Raised when records read back from cold storage don't match the
+    records taken from the head table
+    """
 
 def main():
     order_airtable = airCompressedOrderHistory(PC.base_key, PC.api_key)
-    order_sqltable = sqlCompressedOrderHistory(PC.COLD_STORAGE_ORDERS_DB_LOC)
+    order_sqltable = sqlCompressedOrderHistory(PC.COLD_STORAGE_ORDERS_DB_LOC, profile='archive')
+    order_sqltable.create_table()
 
     rebuild_body(order_sqltable, order_airtable)
 
-def rebuild_body(body, head, date=dt.datetime.today(), cutoff=29):
+    # refresh the planner statistics now the archive has grown
+    order_sqltable.index_manager.analyze()
+    order_sqltable.index_manager.check()
+
+def rebuild_body(body, head, date=dt.datetime.today(), cutoff=29,
+                 batch_size=ARCHIVE_BATCH_SIZE):
     """
     Moves records that are older than date - cutoff days old
     from the head table (airtable) to the body (sqlite3 cold storage)
 
+    Every head record delivered before the cutoff is moved, including
+    ones synced to the head after an earlier run archived their date.
+    Each batch is synced to the body, checked against the body with a
+    checksum and only then deleted from the head. The watermark, where
+    tieredCompressedOrderHistory splits reads between the tables, is
+    moved on once every batch has been deleted.
+
+    Records are deleted from the head as soon as their batch is 
+    committed to the body, so the body must sync every commit to disk,
+    e.g. with the archive profile.
+
     Args:
         body(``sqlCompressedOrderHistory``): SQLLite cold storage 
             CompressedOrderHistory table
@@ -26,34 +57,65 @@ def rebuild_body(body, head, date=dt.datetime.today(), cutoff=29):
         date(``datetime``): Delivery date
         cutoff(``int``): Orders with a delivery date before
             date - timedelta(days=cutoff) will be moved to cold storage
+
+    Keyword Args:
+        batch_size(``int``, optional): number of records to move at once
+
+    Returns:
+        (``int``): number of records moved
     """
 
-    end_date = date - dt.timedelta(days=cutoff)
+    synchronous = body.conn.execute("PRAGMA synchronous").fetchone()[0]
+    if synchronous < SYNCHRONOUS_FULL:
+        raise ValueError(
+            "Cold storage must be opened with synchronous=FULL to archive, "
+            "see ConnectionManager.PROFILES")
+
+    end_date = (date - dt.timedelta(days=cutoff)).date()
+
+    metadata = sqlMetadata(body.db_file)
+    watermark = metadata.get(ARCHIVE_WATERMARK_KEY)
+
+    # Get orders to move from head table, the watermark isn't a lower
+    # bound as late synced orders can be dated before it
+    records = head.get_records_before_delivery_date(end_date)
 
-    # Get all orders to move from head table
-    df = head.get_all_by_delivery_date(dt.datetime.min, dt.datetime.max)
+    for i in range(0, len(records), batch_size):
+        batch = records[i : i + batch_size]
+        rows = [body.fields_to_row(r['fields']) for r in batch]
 
-    # convert delivery date column to string so it can be safely synced
-    # to no sql
-    df['DeliveryDate'] = df['DeliveryDate'].dt.strftime('%Y-%m-%d')
+        # Sync orders to cold storage and check they all arrived
+        body.sync_by_ID(rows)
+        stored = body.get_all_by_IDs([row['ID'] for row in rows])
 
-    # Drop unused columns and convert df to records format
-    orders_for_cold_storage = df.to_dict('records')
+        if _checksum(body, rows) != _checksum(body, stored.to_dict('records')):
+            raise ArchiveChecksumError(
+                "Orders {} to {} were not archived correctly".format(
+                    rows[0]['ID'], rows[-1]['ID']))
 
-    # Sync orders to cold storage 
-    body.sync_by_ID(orders_for_cold_storage)
+        # batch delete from head using airtable record id
+        head.batch_delete([r['id'] for r in batch])
 
-    # # Get order IDs of the records we are moving 
-    # IDs_to_del = [r['ID'] for r in orders_for_cold_storage]
+    # never move the boundary back over records already archived
+    if watermark:
+        end_date = max(end_date, dt.date.fromisoformat(watermark))
+    metadata.set(ARCHIVE_WATERMARK_KEY, end_date.isoformat())
+
+    return len(records)
+
+def _checksum(body, rows):
+    """
+    Order independent checksum of a list of rows
+    """
+    rows = sorted(rows, key=lambda row: int(row['ID']))
+    digest = hashlib.sha256()
 
-    # # Get airtable records of the IDs we are moving
-    # records_to_del = head.get_all_by_IDs(IDs_to_del)
-    
-    # # airtable record IDs
-    # recordIDs_to_del = [r['id'] for r in records_to_del]
+    for row in rows:
+        values = [int(row['ID']), float(row['Total'])]
+        values += [str(row[col]) for col in body.columns if col not in ('ID', 'Total')]
+        digest.update(json.dumps(values).encode())
 
-    # # batch delete from head using airtable record id    
-    # head.batch_delete(recordIDs_to_del)
+    return digest.hexdigest()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
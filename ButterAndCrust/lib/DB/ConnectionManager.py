@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import threading
+
+class ConnectionManager(object):
+    """
+    Hands out sqlite connections to a single db file, one per thread
+    and pragma profile, so every SQLTable on the same file shares them.
+
+    Every profile puts the db in WAL mode so readers can query the db
+    while another connection is writing to it.
+
+    Use ConnectionManager.shared(db_file) so that every table on the
+    same db file in a process shares the same connections.
+
+    Profiles:
+        bulk_load: large cache and no fsync, only for loads whose
+            source still holds every row, so a load lost to a crash
+            can be re-run. Never for moves that delete the source
+        archive: large cache with every commit synced to disk, for
+            moves that delete the source rows once they are committed
+        oltp: durable at commit in WAL mode, for day to day reads and
+            writes
+        reporting: read only with a large cache and memory map, for
+            exports and long range queries
+    """
+
+    # pragmas are applied in order, journal_mode must come before
+    # query_only as switching to WAL is a write
+    PROFILES = {
+        'bulk_load': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'OFF'),
+            ('cache_size', -262144),
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+        ],
+        'archive': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'FULL'),
+            ('cache_size', -262144),
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+        ],
+        'oltp': [
+            ('journal_mode', 'WAL'),
+            ('synchronous', 'NORMAL'),
+            ('cache_size', -65536),
+            ('mmap_size', 268435456),
+            ('temp_store', 'MEMORY'),
+        ],
+        'reporting': [
+            ('journal_mode', 'WAL'),
+            ('cache_size', -131072),
+            ('mmap_size', 1073741824),
+            ('temp_store', 'MEMORY'),
+            ('query_only', 'ON'),
+        ],
+    }
+
+    DEFAULT_PROFILE = 'oltp'
+
+    # seconds to wait on a locked db before raising
+    TIMEOUT = 30.0
+
+    # compiled statements kept per connection, keyed by sql text
+    CACHED_STATEMENTS = 256
+
+    _shared = dict()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, db_file):
+        """
+        Instantiates a new instance of the ConnectionManager class
+
+        Args:
+            db_file(``str``): filepath of the database
+        """
+        self.db_file = db_file
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, db_file):
+        """
+        Gets the connection manager shared by everything in this process
+        that uses db_file, creating it on first use. In memory dbs are
+        never shared.
+
+        Args:
+            db_file(``str``): filepath of the database
+        """
+        if db_file == ":memory:":
+            return cls(db_file)
+
+        key = os.path.abspath(db_file)
+
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(db_file)
+            return cls._shared[key]
+
+    def connection(self, profile=DEFAULT_PROFILE):
+        """
+        Gets this thread's connection for a pragma profile, opening it
+        on first use.
+
+        Args:
+            profile(``str``, optional): name of a profile in PROFILES
+
+        Returns:
+            conn(``sqlite connection obj``)
+        """
+        connections = getattr(self._local, 'connections', None)
+
+        if connections is None:
+            connections = self._local.connections = dict()
+
+        if profile not in connections:
+            connections[profile] = self._connect(profile)
+
+        return connections[profile]
+
+    def _connect(self, profile):
+        """
+        Opens a new connection and applies the pragmas of profile
+        """
+        pragmas = self.PROFILES[profile]
+
+        # connections are only used by the thread that opened them but
+        # may be closed from another by close_all
+        conn = sqlite3.connect(self.db_file, timeout=self.TIMEOUT,
+                               cached_statements=self.CACHED_STATEMENTS,
+                               check_same_thread=False)
+
+        for name, value in pragmas:
+            conn.execute("PRAGMA {}={}".format(name, value))
+
+        with self._lock:
+            self._connections.append(conn)
+
+        return conn
+
+    def close_all(self):
+        """
+        Closes every connection opened by this manager, in every thread.
+        New connections are opened on next use.
+        """
+        with self._lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+
+        for conn in connections:
+            conn.close()
@@ -0,0 +1,116 @@
+import re
+import warnings
+
+class FullScanWarning(UserWarning):
+    """
+    Warned when a registered hot query is planned as a full table scan
+    """
+
+class IndexManager(object):
+    """
+    Keeps the declared indices of a SQLTable in the db and checks that
+    its hot queries are planned to use them.
+
+    Indices may be composite or covering, a covering index holds every
+    column a query reads so sqlite never has to look up the table row.
+
+    Hot queries are registered with sample parameters and checked with
+    EXPLAIN QUERY PLAN, a FullScanWarning is warned for any that would
+    scan the whole table.
+    """
+
+    def __init__(self, table):
+        """
+        Instantiates a new instance of the IndexManager class
+
+        Args:
+            table(``SQLTable``): table whose indices are managed
+        """
+        self.table = table
+        self.hot_queries = dict()
+
+        # a scan reads every row of the table, or of an index when it is
+        # USING one, older sqlite builds write "SCAN TABLE name"
+        self._full_scan = re.compile(
+            r"^SCAN (TABLE )?{}\b".format(re.escape(table.name)))
+
+    def ensure(self):
+        """
+        Creates any declared index that isn't already in the db, so
+        indices declared after a db was created are added to it.
+        """
+        for index in self.table.indices:
+            sql = "CREATE {unique} INDEX IF NOT EXISTS {name} ON {table}({cols})".format(
+                unique="UNIQUE" if index.is_unique else "",
+                name=index.name,
+                table=self.table.name,
+                cols=",".join(index.columns)
+            )
+            self.table._execute(sql)
+
+    def analyze(self):
+        """
+        Gathers the table and index statistics used by the query planner
+        """
+        self.table._execute("ANALYZE {}".format(self.table.name))
+
+    def explain(self, sql, params=()):
+        """
+        Gets the query plan of a sql statement
+
+        Args:
+            sql(``str``): sql statement
+
+        Keyword Args:
+            params(``tuple``, optional): parameters to bind to the sql
+                statement
+
+        Returns:
+            (``list of str``): detail of each step of the plan
+        """
+        conn = self.table.conn
+
+        # sqlite doesn't re-plan a cached EXPLAIN after the schema changes,
+        # so the schema version is part of the statement text
+        version = conn.execute("PRAGMA schema_version").fetchone()[0]
+        explain = "EXPLAIN QUERY PLAN {}\n-- schema {}".format(sql, version)
+
+        rows = conn.execute(explain, params).fetchall()
+        return [row[-1] for row in rows]
+
+    def register(self, name, sql, params=()):
+        """
+        Registers a hot query, one that should always be answered from
+        an index
+
+        Args:
+            name(``str``): name to report the query by
+            sql(``str``): sql statement
+
+        Keyword Args:
+            params(``tuple``, optional): sample parameters to plan with
+        """
+        self.hot_queries[name] = (sql, params)
+
+    def check(self):
+        """
+        Plans every hot query and warns a FullScanWarning for each that
+        would scan the whole table.
+
+        Returns:
+            (``dict``): plan of each hot query, by name
+        """
+        plans = dict()
+
+        for name, (sql, params) in self.hot_queries.items():
+            plan = self.explain(sql, params)
+            plans[name] = plan
+
+            if any(self._full_scan.match(step) for step in plan):
+                warnings.warn(
+                    "Hot query {} on {} is a full table scan: {}".format(
+                        name, self.table.name, "; ".join(plan)),
+                    FullScanWarning
+                )
+
+        return plans
@@ -0,0 +1,170 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+class RequestScheduler(object):
+    """
+    Shapes the requests made to a rate limited API.
+
+    Requests are paced with a token bucket, at most max_concurrent of
+    them run at once and any that fail with a 429 or 5xx status are
+    retried with exponential backoff.
+
+    Use RequestScheduler.shared(key) so that every table using the same
+    Airtable base in a process draws from the same limit.
+
+    Attributes:
+        request_count(``int``): number of requests sent, incl. retries
+        wait_time(``float``): seconds spent waiting on the rate limit
+        retry_count(``int``): number of requests that were retried
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    _shared = dict()
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=5.0, burst=5, max_concurrent=5, max_retries=5,
+                 backoff=0.5, max_backoff=30.0):
+        """
+        Instantiates a new instance of the RequestScheduler class
+
+        Keyword Args:
+            rate(``float``, optional): requests per second
+            burst(``int``, optional): max requests that can be sent at
+                once after being idle
+            max_concurrent(``int``, optional): max requests in flight
+            max_retries(``int``, optional): max retries per request
+            backoff(``float``, optional): seconds to wait before the
+                first retry, doubled on each retry
+            max_backoff(``float``, optional): max seconds between retries
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrent = max_concurrent
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_concurrent)
+
+        self.request_count = 0
+        self.wait_time = 0.0
+        self.retry_count = 0
+
+    @classmethod
+    def shared(cls, key, **kwargs):
+        """
+        Gets the scheduler shared by everything in this process that
+        uses key, creating it on first use.
+
+        Args:
+            key(``str``): identifier of the rate limited resource, e.g.
+                an Airtable base key
+
+        Keyword Args:
+            kwargs: passed to the constructor on first use
+        """
+        with cls._shared_lock:
+            if key not in cls._shared:
+                cls._shared[key] = cls(**kwargs)
+            return cls._shared[key]
+
+    def _acquire_token(self):
+        """
+        Blocks until the token bucket allows another request
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst,
+                                   self._tokens + (now - self._last_refill) * self.rate)
+                self._last_refill = now
+
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.request_count += 1
+                    return
+
+                wait = (1 - self._tokens) / self.rate
+                self.wait_time += wait
+
+            time.sleep(wait)
+
+    def _retry_delay(self, response, attempt):
+        """
+        Seconds to wait before retrying, honouring any Retry-After header
+        """
+        retry_after = getattr(response, 'headers', {}).get('Retry-After')
+
+        try:
+            return float(retry_after)
+        except (TypeError, ValueError):
+            return min(self.max_backoff, self.backoff * 2 ** attempt)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        Calls func under the rate limit, retrying it when it raises an
+        HTTPError with a retryable status.
+
+        Args:
+            func(``callable``): function that makes a single request
+
+        Returns:
+            the return value of func
+        """
+        attempt = 0
+
+        with self._slots:
+            while True:
+                self._acquire_token()
+
+                try:
+                    return func(*args, **kwargs)
+                except requests.exceptions.HTTPError as exc:
+                    status = getattr(exc.response, 'status_code', None)
+
+                    if status not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                        raise
+
+                    delay = self._retry_delay(exc.response, attempt)
+
+                    with self._lock:
+                        self.retry_count += 1
+
+                    attempt += 1
+                    time.sleep(delay)
+
+    def map(self, func, iterable):
+        """
+        Calls func for every item of iterable concurrently, up to
+        max_concurrent at a time. func should make its requests through
+        this scheduler.
+
+        Returns:
+            (``list``): results in the same order as iterable
+        """
+        items = list(iterable)
+
+        if len(items) <= 1:
+            return [func(item) for item in items]
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent) as pool:
+            return list(pool.map(func, items))
+
+    @property
+    def stats(self):
+        """
+        Snapshot of the scheduler counters
+        """
+        with self._lock:
+            return {
+                'requests': self.request_count,
+                'wait_time': self.wait_time,
+                'retries': self.retry_count
+            }
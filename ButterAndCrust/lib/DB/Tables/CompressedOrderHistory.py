@@ -1,9 +1,13 @@
 import datetime as dt
 import abc
+import threading
 from airtable import Airtable
 import pandas as pd
 
-from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable
+from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable, build_statement
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata, ARCHIVE_WATERMARK_KEY
+from ButterAndCrust.lib.DB.RequestScheduler import RequestScheduler
+from ButterAndCrust.lib.DB.ConnectionManager import ConnectionManager
 
 class ICompressedOrderHistory(metaclass=abc.ABCMeta):
     """
@@ -17,6 +21,26 @@ class ICompressedOrderHistory(metaclass=abc.ABCMeta):
 
     NAME = "CompressedOrderHistory"
 
+    # ordinal of the first epoch day, 1970-01-01
+    EPOCH_ORDINAL = dt.date(1970, 1, 1).toordinal()
+
+    @classmethod
+    def to_epoch_day(cls, date):
+        """
+        Converts a delivery date to the number of days since 1970-01-01
+
+        Args:
+            date(``date``, ``datetime`` or ``str``): delivery date, 
+                strings must start with a '%Y-%m-%d' date
+
+        Returns:
+            (``int``): epoch day
+        """
+        if isinstance(date, str):
+            date = dt.date.fromisoformat(date[:10])
+
+        return date.toordinal() - cls.EPOCH_ORDINAL
+
     @abc.abstractmethod
     def get_max(self, col_name: str):
         """
@@ -30,6 +54,19 @@ class ICompressedOrderHistory(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    @abc.abstractmethod
+    def get_min(self, col_name: str):
+        """
+        Gets the minimum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            min value in col_name
+        """
+        raise NotImplementedError
+
     @abc.abstractmethod
     def get_all_by_IDs(self, IDs: list):
         """
@@ -61,6 +98,21 @@ class ICompressedOrderHistory(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def iter_by_delivery_date(self, start_date, end_date, chunksize=None):
+        """
+        Streams the records between [start_date, end_date) as 
+        DataFrames. Tables that can't stream yield a single DataFrame.
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+            chunksize(``int``, optional): max rows per DataFrame
+
+        Yields:
+            (``DataFrame``): consecutive chunks of the records
+        """
+        yield self.get_all_by_delivery_date(start_date, end_date)
+
     @abc.abstractmethod
     def sync_by_ID(self, records: list):
         """
@@ -76,6 +128,25 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
     """
     Airtable implementation of CompressedOrderHistory
     """
+
+    COLUMNS = [
+        'ID',
+        'Email',
+        'DeliveryDate',
+        'Lineitems',
+        'BillingAddress',
+        'ShippingAddress',
+        'Total',
+        'DeliveryNotes'
+    ]
+
+    # keeps filter formulas well inside the API's url length limit
+    MAX_FORMULA_LENGTH = 1500
+
+    # pacing is done by the shared RequestScheduler rather than fixed
+    # sleeps between requests
+    API_LIMIT = 0
+
     def __init__(self, base_key, api_key):
 
         NAME = "CompressedOrderHistory"
@@ -84,12 +155,104 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
         self.name = NAME
         self._base_key = base_key
         self._api_key = api_key
+        self.request_count = 0
+        self._extrema = dict()
+        self._count_lock = threading.Lock()
+
+        # airtable limits requests per base so share a scheduler per base
+        self.scheduler = RequestScheduler.shared(base_key)
+
+    def _request(self, method, url, params=None, json_data=None):
+        """
+        Overrides the default implementation to send every request
+        through the shared RequestScheduler and count the API requests
+        made by this table
+        """
+        with self._count_lock:
+            self.request_count += 1
+
+        return self.scheduler.submit(super()._request, method, url,
+                                     params=params, json_data=json_data)
+
+    def _batch_requests(self, send, items):
+        """
+        Sends items in chunks of MAX_RECORDS_PER_REQUEST concurrently
+        through the scheduler
+
+        Args:
+            send(``callable``): sends a single chunk and returns a list
+            items(``list``): items to send
+
+        Returns:
+            (``list``): concatenated results in the order of items
+        """
+        chunks = list(self._chunk(items, self.MAX_RECORDS_PER_REQUEST))
+        results = self.scheduler.map(send, chunks)
+        return [record for result in results for record in result]
+
+    def batch_insert(self, records, typecast=False):
+        """
+        Overrides the default implementation to insert chunks of records
+        concurrently within the rate limit
+
+        Args:
+            records(``list``): Records to insert
+            typecast(``boolean``): Automatic data conversion from string
+                values.
+
+        Returns:
+            records (``list``): list of added records
+        """
+        def send(chunk):
+            json_data = {"records": self._build_batch_record_objects(chunk),
+                         "typecast": typecast}
+            return self._post(self.url_table, json_data=json_data)["records"]
+
+        return self._batch_requests(send, records)
+
+    def batch_update(self, records, typecast=False):
+        """
+        Overrides the default implementation to update chunks of records
+        concurrently within the rate limit
+
+        Args:
+            records(``list``): Records to update, each a dict with the
+                airtable record 'id' and 'fields'
+            typecast(``boolean``): Automatic data conversion from string
+                values.
+
+        Returns:
+            records (``list``): list of updated records
+        """
+        def send(chunk):
+            json_data = {"records": chunk, "typecast": typecast}
+            return self._patch(self.url_table, json_data=json_data)["records"]
+
+        return self._batch_requests(send, records)
+
+    def batch_delete(self, record_ids):
+        """
+        Overrides the default implementation to delete chunks of records
+        concurrently within the rate limit
+
+        Args:
+            record_ids(``list``): airtable record ids to delete
+
+        Returns:
+            records (``list``): list of deleted records
+        """
+        def send(chunk):
+            response = self._delete_batch(chunk)
+            return response["records"] if len(chunk) > 1 else [response]
+
+        self._extrema.clear()
+        return self._batch_requests(send, record_ids)
 
     def _records_to_df(self, records):
         """
         Converts list of records into a pandas df
         """
-        df = pd.DataFrame.from_records((r['fields'] for r in records))
+        df = pd.DataFrame.from_records([r['fields'] for r in records], columns=self.COLUMNS)
 
         # convert dtypes
         df['DeliveryDate'] = pd.to_datetime(df['DeliveryDate'], format='%Y-%m-%dT%H:%M:%S.%fZ')
@@ -101,6 +264,38 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
 
         return df
 
+    def _get_extreme(self, col_name, direction):
+        """
+        Gets the first non blank value of a column when sorted in the
+        given direction by fetching a single projected record. Results
+        are memoised until the next sync_by_ID.
+
+        Args:
+            col_name(``str``): name of field
+            direction(``str``): 'asc' for the min or 'desc' for the max
+
+        Returns:
+            value of col_name or None if the table is empty
+        """
+        key = (col_name, direction)
+
+        if key not in self._extrema:
+            records = self.get_all(
+                formula="NOT({{{col}}}=BLANK())".format(col=col_name),
+                sort=[(col_name, direction)],
+                fields=[col_name],
+                max_records=1
+            )
+
+            value = records[0]['fields'][col_name] if records else None
+
+            if value is not None and col_name == 'DeliveryDate':
+                value = pd.to_datetime(value, format='%Y-%m-%dT%H:%M:%S.%fZ')
+
+            self._extrema[key] = value
+
+        return self._extrema[key]
+
     def get_max(self, col_name):
         """
         Gets the maximum value of a specified column in the table.
@@ -111,9 +306,19 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
         Returns:
             max value in col_name
         """
-        df = self._records_to_df(self.get_all())
+        return self._get_extreme(col_name, 'desc')
 
-        return df[col_name].max()
+    def get_min(self, col_name):
+        """
+        Gets the minimum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            min value in col_name
+        """
+        return self._get_extreme(col_name, 'asc')
 
     def get_all_by_IDs(self, IDs):
         """
@@ -126,8 +331,46 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
             (``list``): list of records
         """
 
-        formula = "OR(" + ",".join(["{ID}=" + str(ID) for ID in IDs]) + ")"
-        return self.get_all(formula=formula)
+        formulas = list(self._chunk_ID_formulas(IDs))
+
+        results = self.scheduler.map(lambda formula: self.get_all(formula=formula),
+                                     formulas)
+
+        # merge chunks, dropping any record returned more than once
+        records = dict()
+        for chunk in results:
+            for record in chunk:
+                records[record['id']] = record
+
+        return list(records.values())
+
+    def _chunk_ID_formulas(self, IDs):
+        """
+        Splits IDs into OR({ID}=1,{ID}=2,...) formulas that are each no
+        longer than MAX_FORMULA_LENGTH
+
+        Args:
+            IDs(``list of ints``): list of order IDs
+
+        Yields:
+            (``str``): filter formula
+        """
+        terms = []
+        length = len("OR()")
+
+        for ID in dict.fromkeys(IDs):
+            term = "{ID}=" + str(ID)
+
+            if terms and length + len(term) + 1 > self.MAX_FORMULA_LENGTH:
+                yield "OR(" + ",".join(terms) + ")"
+                terms = []
+                length = len("OR()")
+
+            terms.append(term)
+            length += len(term) + 1
+
+        if terms:
+            yield "OR(" + ",".join(terms) + ")"
 
     def get_all_by_delivery_date(self, start_date, end_date):
         """
@@ -137,6 +380,22 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
             start_date(``datetime``): start date to get orders (inclusive)
             end_date(``datetime``): end date to get orders (exclusive)
         """
+        records = self.get_records_by_delivery_date(start_date, end_date)
+        df = self._records_to_df(records)
+        return df
+
+    def get_records_by_delivery_date(self, start_date, end_date):
+        """
+        Gets the airtable records, incl. record ids, by delivery date 
+        between [start_date, end_date)
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+
+        Returns:
+            (``list``): list of records
+        """
 
         start_date = start_date.date() if isinstance(start_date, dt.datetime) else start_date
         end_date = end_date.date() if isinstance(end_date, dt.datetime) else end_date
@@ -154,9 +413,28 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
                 s_date=start_date
             )
 
-        records = self.get_all(formula=formula)
-        df = self._records_to_df(records)
-        return df
+        return self.get_all(formula=formula)
+
+    def get_records_before_delivery_date(self, end_date):
+        """
+        Gets the airtable records, incl. record ids, with a delivery date
+        before end_date
+
+        Args: 
+            end_date(``datetime``): end date to get orders (exclusive)
+
+        Returns:
+            (``list``): list of records
+        """
+
+        end_date = end_date.date() if isinstance(end_date, dt.datetime) else end_date
+
+        formula = "{{{col}}}<DATETIME_PARSE('{f_date}', 'YYYY/MM/DD')".format(
+            col="DeliveryDate",
+            f_date=end_date.strftime("%Y/%m/%d")
+        )
+
+        return self.get_all(formula=formula)
 
     def get_most_recent_order_by_email(self, current_date=dt.date.today(),
                                        cutoff=28):
@@ -186,36 +464,90 @@ class airCompressedOrderHistory(Airtable, ICompressedOrderHistory):
         Will syncronise a list of records onto the table. 
         Updates existing records and inserts new ones
 
+        The existing records are fetched once and used to look up the
+        airtable record id of every record to update.
+
         Args:
             records(``list``): list of records to sync
+
+        Keyword Args:
+            update(``bool``, optional): whether to update records that
+                already exist
+
+        Returns:
+            (``int``): number of API requests made
         """
+        requests_before = self.request_count
 
         IDs = [r['ID'] for r in records]
 
-        existing_records_to_update = self.get_all_by_IDs(IDs)
+        existing_records = self.get_all_by_IDs(IDs) if IDs else []
 
-        IDs_to_update = [r['fields']['ID'] for r in existing_records_to_update]
+        record_ids = {r['fields']['ID']: r['id'] for r in existing_records}
 
-        records_to_insert = [r for r in records if r['ID'] not in IDs_to_update]
-        records_to_update = [{'id': self.match('ID', r['ID'])['id'], 'fields': r} for r in records if r['ID'] in IDs_to_update]
+        records_to_insert = [r for r in records if r['ID'] not in record_ids]
+        records_to_update = [{'id': record_ids[r['ID']], 'fields': r} for r in records if r['ID'] in record_ids]
 
         self.batch_insert(records_to_insert)
         
         if update:    
             self.batch_update(records_to_update)
 
+        # cached column extrema may have changed
+        self._extrema.clear()
+
+        return self.request_count - requests_before
+
 class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
     """
     SQLLite implementation of CompressedOrderHistory.
     """
 
-    def __init__(self, db_file):
+    # delivery dates are compared as integer epoch days, taken from the
+    # DeliveryDate text by an index on this expression so the range
+    # predicates compare integers in the index and call no functions
+    DELIVERY_DAY = "CAST(julianday(DeliveryDate) - 2440587.5 AS INTEGER)"
+
+    # bound so the statement is the same for every range and is
+    # compiled once per connection
+    DELIVERY_DATE_WHERE = "{0} >= ? AND {0} < ?".format(DELIVERY_DAY)
+
+    MOST_RECENT_ORDER_SQL = (
+    '''
+    SELECT ID, Email, DeliveryDate, Lineitems
+    FROM
+    (
+        SELECT 
+            ID,
+            Email, 
+            DeliveryDate,
+            Lineitems,
+            MAX(DeliveryDate) OVER (PARTITION BY Email) MaxDeliveryDate
+        FROM
+        (
+            SELECT 
+                ID,
+                Email, 
+                DeliveryDate,
+                Lineitems
+            FROM CompressedOrderHistory
+            WHERE {0} < ? 
+            AND {0} >= ?
+        )
+    )
+    WHERE DeliveryDate = MaxDeliveryDate
+    '''.format(DELIVERY_DAY)
+    )
+
+    def __init__(self, db_file, profile=ConnectionManager.DEFAULT_PROFILE):
         """
         Instantiates a new instance of a sqlCompressedOrderHistory
         obj. 
 
         Args:
             db_file(``str``): filepath of sqllite db file
+            profile(``str``, optional): pragma profile of the 
+                connection, see ConnectionManager.PROFILES
         """
         _NAME = "CompressedOrderHistory"
         _COLUMNS = [
@@ -230,10 +562,27 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
         ]
         _INDICES = [
             SQLTable.index("unique_ID", ["ID"], is_unique=True),
-            SQLTable.index("dup_Email", ["Email"], is_unique=False)
+            SQLTable.index("dup_Email", ["Email"], is_unique=False),
+            # date range scans seek on the epoch day, and the most
+            # recent order query is answered from the index alone
+            SQLTable.index("cover_DeliveryDay",
+                           [self.DELIVERY_DAY, "Email", "ID", "DeliveryDate", "Lineitems"],
+                           is_unique=False)
         ]
 
-        super().__init__(_NAME, _COLUMNS, db_file, _INDICES)
+        super().__init__(_NAME, _COLUMNS, db_file, _INDICES, profile=profile)
+
+        sample_dates = (self.to_epoch_day("2021-01-02"), self.to_epoch_day("2021-01-30"))
+        self.index_manager.register(
+            "get_all_by_delivery_date",
+            build_statement("SELECT", self.name, tuple(self.columns), self.DELIVERY_DATE_WHERE),
+            sample_dates
+        )
+        self.index_manager.register(
+            "get_most_recent_order_by_email",
+            self.MOST_RECENT_ORDER_SQL,
+            sample_dates[::-1]
+        )
 
     def get_max(self, col_name):
         """
@@ -247,6 +596,18 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
         """
         return self.max(col_name)
 
+    def get_min(self, col_name):
+        """
+        Gets the minimum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            min value in col_name
+        """
+        return self.min(col_name)
+
     def get_all_by_IDs(self, IDs):
         """
         Gets all orders by order ID. 
@@ -255,10 +616,21 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
             IDs(``list of ints``): list of order IDs to get 
 
         Returns: 
-            (``list``): list of records
+            (``DataFrame``): DataFrame of records
         """
-        where = "ID in (" + ",".join((str(id) for id in IDs)) + ")"
-        return self.select(where=where)
+        IDs = list(dict.fromkeys(IDs))
+
+        if not IDs:
+            return self.select(where="0")
+
+        # bind IDs as parameters, staying within sqlite's variable limit
+        frames = []
+        for i in range(0, len(IDs), self.MAX_VARIABLES):
+            chunk = IDs[i : i + self.MAX_VARIABLES]
+            where = "ID IN (" + ",".join("?" * len(chunk)) + ")"
+            frames.append(self.select(where=where, params=tuple(chunk)))
+
+        return pd.concat(frames, ignore_index=True)
 
     def get_all_by_delivery_date(self, start_date, end_date):
         """
@@ -271,20 +643,24 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
 
         """
 
-        sql = (
-        '''
-            SELECT *
-            FROM {table}
-            WHERE DeliveryDate >= date('{i_date}') 
-            AND DeliveryDate < date('{f_date}')
-        '''.format(
-                table=self.name,
-                i_date=start_date,
-                f_date=end_date
-            )
-        )
+        return self.select(where=self.DELIVERY_DATE_WHERE,
+                           params=(self.to_epoch_day(start_date),
+                                   self.to_epoch_day(end_date)))
+
+    def iter_by_delivery_date(self, start_date, end_date, chunksize=None):
+        """
+        Streams the orders between start_date and end_date as DataFrames
+        of up to chunksize rows.
 
-        return self.sql_to_df(sql)
+        Args:
+            start_date(``datetime``): inclusive intial date of orders
+            end_date(``datetime``): exclusive final date of orders
+            chunksize(``int``, optional): max rows per DataFrame
+        """
+        return self.select_chunks(where=self.DELIVERY_DATE_WHERE,
+                                  params=(self.to_epoch_day(start_date),
+                                          self.to_epoch_day(end_date)),
+                                  chunksize=chunksize)
 
     def get_most_recent_order_by_email(self, delivery_date, cutoff=28):
         """
@@ -301,48 +677,65 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
 
         cut_off_date = delivery_date - dt.timedelta(days=cutoff)
 
-        sql = (
-        '''
-        SELECT ID, Email, DeliveryDate, Lineitems
-        FROM
-        (
-            SELECT 
-                ID,
-                Email, 
-                DeliveryDate,
-                Lineitems,
-                MAX(DeliveryDate) OVER (PARTITION BY Email) MaxDeliveryDate
-            FROM
-            (
-                SELECT 
-                    ID,
-                    Email, 
-                    DeliveryDate,
-                    Lineitems
-                FROM CompressedOrderHistory
-                WHERE DeliveryDate < date('{d_date}') 
-                AND DeliveryDate >= date('{c_date}')
-            )
-        )
-        WHERE DeliveryDate = MaxDeliveryDate
-        '''.format(
-                d_date=delivery_date,
-                c_date=cut_off_date
-            )
-        )
+        sql = self.MOST_RECENT_ORDER_SQL
+
+        params = (self.to_epoch_day(delivery_date), self.to_epoch_day(cut_off_date))
 
-        return self.sql_to_df(sql)
+        return self.sql_to_df(sql, params=params)
 
     def sync_by_ID(self, records):
         """
         Will syncronise a list of records onto the table. 
-        Updates existing records and inserts new ones. 
+        Updates existing records and inserts new ones in a single 
+        upsert pass over the unique_ID index. 
 
         Args:
             records(``list``): list of records to sync
         """
         self.sync(records, ['ID'])
 
+    def delete_by_IDs(self, IDs):
+        """
+        Deletes orders by order ID
+
+        Args:
+            IDs(``list of ints``): list of order IDs to delete
+        """
+        IDs = list(IDs)
+
+        # bind IDs as parameters, staying within sqlite's variable limit
+        for i in range(0, len(IDs), self.MAX_VARIABLES):
+            chunk = IDs[i : i + self.MAX_VARIABLES]
+            self.delete(where="ID IN (" + ",".join("?" * len(chunk)) + ")",
+                        params=tuple(chunk))
+
+    def fields_to_row(self, fields):
+        """
+        Converts the fields of an airtable record to a row of this table.
+        Airtable omits empty fields so they are filled with blanks.
+
+        Args:
+            fields(``dict``): fields of an airCompressedOrderHistory record
+
+        Returns:
+            (``dict``): row that can be synced to this table
+        """
+        row = {col: fields.get(col, "") for col in self.columns}
+        row['DeliveryDate'] = row['DeliveryDate'][:10]
+        row['Total'] = row['Total'] or 0.0
+        return row
+
+    def create_table(self):
+        """
+        Creates the table if it doesn't already exist in the db and adds
+        any of its indices that are missing
+        """
+        if not self.exists():
+            self._execute(self.generate_create_table_string())
+
+        # also adds indices declared since an existing db was created
+        self.index_manager.ensure()
+
     def generate_create_table_string(self):
         """
         returns the sql string required to create the table with sqlite
@@ -352,7 +745,7 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
         CREATE TABLE CompressedOrderHistory(
         ID INTEGER NOT NULL,
         Email TEXT NOT NULL,
-        DeliveryDate DATETIME NOT NULL,
+        DeliveryDate TEXT NOT NULL,
         Lineitems TEXT NOT NULL,
         BillingAddress TEXT NOT NULL,
         ShippingAddress TEXT NOT NULL,
@@ -362,3 +755,422 @@ class sqlCompressedOrderHistory(SQLTable, ICompressedOrderHistory):
         ''')
 
         return table
+
+class mirrorCompressedOrderHistory(ICompressedOrderHistory):
+    """
+    Read-through mirror of the airtable CompressedOrderHistory.
+
+    Keeps a local sqlite copy of the airtable head table that is
+    refreshed with only the records modified since the last refresh.
+    Reads are served from the local copy and syncs are written through
+    to airtable and then the local copy.
+
+    Records deleted from airtable, e.g. cancelled orders or orders moved
+    to cold storage, are dropped from the mirror on refresh, so the
+    mirror holds the same orders as the head table.
+    """
+
+    WATERMARK_KEY = "MirrorWatermark"
+    WATERMARK_FORMAT = "%Y-%m-%dT%H:%M:%S.000Z"
+
+    # re-pulls records modified just before the last refresh to allow
+    # for clock differences with airtable
+    REFRESH_OVERLAP = dt.timedelta(minutes=5)
+
+    def __init__(self, head, db_file):
+        """
+        Instantiates a new instance of a mirrorCompressedOrderHistory
+        obj.
+
+        Args:
+            head(``airCompressedOrderHistory``): airtable table to mirror
+            db_file(``str``): filepath of the local sqlite mirror
+        """
+        self.name = head.name
+        self.head = head
+        self.mirror = sqlCompressedOrderHistory(db_file)
+        self.mirror.create_table()
+        self.metadata = sqlMetadata(db_file)
+        self._is_fresh = False
+
+    def refresh(self):
+        """
+        Pulls the records modified in airtable since the last refresh
+        into the local mirror and drops the records that have been
+        deleted from airtable.
+
+        Returns:
+            (``int``): number of records pulled
+        """
+        refresh_time = dt.datetime.utcnow() - self.REFRESH_OVERLAP
+        watermark = self.metadata.get(self.WATERMARK_KEY)
+
+        if watermark:
+            formula = "IS_AFTER(LAST_MODIFIED_TIME(), '{}')".format(watermark)
+            records = self.head.get_all(formula=formula)
+
+            # deletions don't show up in a delta, so list the IDs still
+            # in airtable, which only holds the orders not yet archived
+            head_IDs = [r['fields'].get('ID') for r in self.head.get_all(fields=['ID'])]
+        else:
+            records = self.head.get_all()
+            head_IDs = [r['fields'].get('ID') for r in records]
+
+        self.mirror.sync_by_ID([self.mirror.fields_to_row(r['fields']) for r in records])
+
+        head_IDs = set(head_IDs)
+        deleted = [int(ID) for ID in self.mirror.select(columns=['ID'])['ID'] if ID not in head_IDs]
+        self.mirror.delete_by_IDs(deleted)
+
+        self.metadata.set(self.WATERMARK_KEY, refresh_time.strftime(self.WATERMARK_FORMAT))
+        self._is_fresh = True
+
+        return len(records)
+
+    def _ensure_fresh(self):
+        """
+        Refreshes the mirror on first use
+        """
+        if not self._is_fresh:
+            self.refresh()
+
+    def _to_head_format(self, df):
+        """
+        Converts a DataFrame from the mirror to the dtypes returned by
+        the airtable implementation
+        """
+        df['DeliveryDate'] = pd.to_datetime(df['DeliveryDate'], format='%Y-%m-%d')
+        return df
+
+    def get_max(self, col_name):
+        """
+        Gets the maximum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            max value in col_name
+        """
+        self._ensure_fresh()
+        value = self.mirror.get_max(col_name)
+
+        if value is not None and col_name == 'DeliveryDate':
+            value = pd.to_datetime(value, format='%Y-%m-%d')
+
+        return value
+
+    def get_min(self, col_name):
+        """
+        Gets the minimum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            min value in col_name
+        """
+        self._ensure_fresh()
+        value = self.mirror.get_min(col_name)
+
+        if value is not None and col_name == 'DeliveryDate':
+            value = pd.to_datetime(value, format='%Y-%m-%d')
+
+        return value
+
+    def get_all_by_IDs(self, IDs):
+        """
+        Gets all orders by order ID from airtable, as the airtable
+        record ids are needed by callers.
+
+        Args:
+            IDs(``list of ints``): list of order IDs to get 
+
+        Returns: 
+            (``list``): list of records
+        """
+        return self.head.get_all_by_IDs(IDs)
+
+    def get_all_by_delivery_date(self, start_date, end_date):
+        """
+        Gets all records by delivery date between [start_date, end_date)
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+        """
+        self._ensure_fresh()
+        df = self.mirror.get_all_by_delivery_date(start_date, end_date)
+        return self._to_head_format(df)
+
+    def iter_by_delivery_date(self, start_date, end_date, chunksize=None):
+        """
+        Streams the records between [start_date, end_date) from the
+        mirror as DataFrames of up to chunksize rows.
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+            chunksize(``int``, optional): max rows per DataFrame
+        """
+        self._ensure_fresh()
+
+        for df in self.mirror.iter_by_delivery_date(start_date, end_date, chunksize):
+            yield self._to_head_format(df)
+
+    def get_most_recent_order_by_email(self, current_date=dt.date.today(),
+                                       cutoff=28):
+        """
+        Gets each customers most recent order and returns the results 
+        in a dateframe. 
+
+        Args: 
+            current_date(``datetime``, optional): current date, default
+                is today
+            cutoff(``int``): max number of days before current_date
+                to load
+        
+        Returns:
+            df(``DataFrame``): Dataframe of each customers most recent 
+                orders
+        """
+        cutoff_date = current_date - dt.timedelta(days=cutoff + 1)
+
+        df = self.get_all_by_delivery_date(cutoff_date, current_date)
+        df = df.loc[df.reset_index().groupby(['Email'])['DeliveryDate'].idxmax()]
+
+        return df
+
+    def sync_by_ID(self, records, update=False):
+        """
+        Will syncronise a list of records onto airtable and then the
+        local mirror. Updates existing records and inserts new ones
+
+        Args:
+            records(``list``): list of records to sync
+
+        Keyword Args:
+            update(``bool``, optional): whether to update records that
+                already exist
+
+        Returns:
+            (``int``): number of API requests made
+        """
+        self._ensure_fresh()
+
+        num_requests = self.head.sync_by_ID(records, update=update)
+
+        if not update:
+            # existing records are left untouched in airtable
+            existing = set(self.mirror.get_all_by_IDs([r['ID'] for r in records])['ID'])
+            records = [r for r in records if r['ID'] not in existing]
+
+        self.mirror.sync_by_ID(records)
+
+        return num_requests
+
+class tieredCompressedOrderHistory(ICompressedOrderHistory):
+    """
+    CompressedOrderHistory spread across a hot table, holding the recent
+    orders, and a sqlite cold storage table that RebuildBody archives
+    older orders into.
+
+    Queries are split at the archive watermark: orders delivered before
+    it are read from cold storage and only the rest from the hot table.
+    Until anything has been archived every query goes to the hot table.
+
+    Without a hot table only the archived orders are read by delivery
+    date, e.g. to export them offline.
+    """
+
+    def __init__(self, hot, cold):
+        """
+        Instantiates a new instance of a tieredCompressedOrderHistory
+        obj.
+
+        Args:
+            hot(``ICompressedOrderHistory``): airtable (or mirror of the
+                airtable) table of recent orders, or None
+            cold(``sqlCompressedOrderHistory``): cold storage table
+        """
+        self.name = cold.name
+        self.hot = hot
+        self.cold = cold
+        self.metadata = sqlMetadata(cold.db_file)
+
+    @property
+    def boundary(self):
+        """
+        First delivery date held in the hot table, None if nothing has
+        been archived
+        """
+        watermark = self.metadata.get(ARCHIVE_WATERMARK_KEY)
+        return dt.datetime.fromisoformat(watermark) if watermark else None
+
+    def get_max(self, col_name):
+        """
+        Gets the maximum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            max value in col_name
+        """
+        value = self.hot.get_max(col_name)
+
+        # archived orders are always older than the hot ones
+        if value is not None and col_name == 'DeliveryDate':
+            return value
+
+        return self._extreme(max, value, self.cold.get_max(col_name), col_name)
+
+    def get_min(self, col_name):
+        """
+        Gets the minimum value of a specified column in the table.
+
+        Args:
+            col_name(``str``): name of field
+
+        Returns:
+            min value in col_name
+        """
+        value = self.cold.get_min(col_name)
+
+        if value is not None and col_name == 'DeliveryDate':
+            return pd.to_datetime(value, format='%Y-%m-%d')
+
+        return self._extreme(min, self.hot.get_min(col_name), value, col_name)
+
+    @staticmethod
+    def _extreme(func, hot_value, cold_value, col_name):
+        """
+        Applies func to whichever of the hot and cold values are set
+        """
+        if cold_value is not None and col_name == 'DeliveryDate':
+            cold_value = pd.to_datetime(cold_value, format='%Y-%m-%d')
+
+        values = [v for v in (hot_value, cold_value) if v is not None]
+
+        return func(values) if values else None
+
+    def get_all_by_IDs(self, IDs):
+        """
+        Gets all orders by order ID from the hot table, which holds the 
+        orders that are still being written to.
+
+        Args:
+            IDs(``list of ints``): list of order IDs to get 
+
+        Returns: 
+            records in the format of the hot table
+        """
+        return self.hot.get_all_by_IDs(IDs)
+
+    def get_all_by_delivery_date(self, start_date, end_date):
+        """
+        Gets all records by delivery date between [start_date, end_date)
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+        """
+        frames = []
+
+        for table, start, end in self._split_at_boundary(start_date, end_date):
+            df = table.get_all_by_delivery_date(start, end)
+            frames.append(self._cold_to_hot_format(df) if table is self.cold else df)
+
+        if len(frames) == 1:
+            return frames[0]
+
+        return pd.concat(frames, ignore_index=True)
+
+    def iter_by_delivery_date(self, start_date, end_date, chunksize=None):
+        """
+        Streams the records between [start_date, end_date) as DataFrames,
+        the archived ones first.
+
+        Args: 
+            start_date(``datetime``): start date to get orders (inclusive)
+            end_date(``datetime``): end date to get orders (exclusive)
+            chunksize(``int``, optional): max rows per DataFrame
+        """
+        for table, start, end in self._split_at_boundary(start_date, end_date):
+            for df in table.iter_by_delivery_date(start, end, chunksize):
+                yield self._cold_to_hot_format(df) if table is self.cold else df
+
+    def _split_at_boundary(self, start_date, end_date):
+        """
+        Splits [start_date, end_date) at the boundary
+
+        Returns:
+            (``list``): (table, start date, end date) to query in each
+                tier, in delivery date order
+        """
+        boundary = self.boundary
+
+        # compare dates as datetimes with the boundary
+        start_date, end_date = [
+            d if isinstance(d, dt.datetime) else dt.datetime.combine(d, dt.time())
+            for d in (start_date, end_date)
+        ]
+
+        if boundary is None:
+            return [(self.hot, start_date, end_date)] if self.hot else []
+
+        ranges = []
+
+        if start_date < boundary:
+            ranges.append((self.cold, start_date, min(end_date, boundary)))
+
+        if end_date > boundary and self.hot:
+            ranges.append((self.hot, max(start_date, boundary), end_date))
+
+        return ranges
+
+    @staticmethod
+    def _cold_to_hot_format(df):
+        """
+        Converts a DataFrame from cold storage to the dtypes of the hot
+        table
+        """
+        df['DeliveryDate'] = pd.to_datetime(df['DeliveryDate'], format='%Y-%m-%d')
+        return df
+
+    def get_most_recent_order_by_email(self, current_date=dt.date.today(),
+                                       cutoff=28):
+        """
+        Gets each customers most recent order and returns the results 
+        in a dateframe. 
+
+        Args: 
+            current_date(``datetime``, optional): current date, default
+                is today
+            cutoff(``int``): max number of days before current_date
+                to load
+        
+        Returns:
+            df(``DataFrame``): Dataframe of each customers most recent 
+                orders
+        """
+        cutoff_date = current_date - dt.timedelta(days=cutoff + 1)
+
+        df = self.get_all_by_delivery_date(cutoff_date, current_date)
+        df = df.loc[df.reset_index().groupby(['Email'])['DeliveryDate'].idxmax()]
+
+        return df
+
+    def sync_by_ID(self, records, **kwargs):
+        """
+        Will syncronise a list of records onto the hot table, where new 
+        orders are always written.
+
+        Args:
+            records(``list``): list of records to sync
+
+        Keyword Args:
+            kwargs: passed on to the hot table
+        """
+        return self.hot.sync_by_ID(records, **kwargs)
+
@@ -0,0 +1,57 @@
+from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable
+
+# last delivery date (exclusive) moved into cold storage by RebuildBody
+ARCHIVE_WATERMARK_KEY = "ArchiveWatermark"
+
+class sqlMetadata(SQLTable):
+    """
+    Key value table kept alongside the other tables of a sqlite db for
+    bookkeeping, e.g. refresh and archive watermarks.
+    """
+
+    def __init__(self, db_file):
+        """
+        Instantiates a new instance of a sqlMetadata obj, creating the
+        table if it doesn't already exist.
+
+        Args:
+            db_file(``str``): filepath of sqllite db file
+        """
+        _NAME = "Metadata"
+        _COLUMNS = ['Key', 'Value']
+
+        super().__init__(_NAME, _COLUMNS, db_file)
+
+        self._execute('''
+            CREATE TABLE IF NOT EXISTS Metadata(
+            Key TEXT PRIMARY KEY,
+            Value TEXT NOT NULL
+            )
+        ''')
+
+    def get(self, key, default=None):
+        """
+        Gets the value stored for key.
+
+        Args:
+            key(``str``): key to look up
+
+        Keyword Args:
+            default(optional): returned if key has no value
+
+        Returns:
+            (``str``): stored value
+        """
+        df = self.select(columns=['Value'], where="Key = ?", params=(key,))
+
+        return df['Value'].iloc[0] if len(df.index) else default
+
+    def set(self, key, value):
+        """
+        Stores a value for key, replacing any existing value.
+
+        Args:
+            key(``str``): key to store
+            value: value to store, saved as a string
+        """
+        self.sync([{'Key': key, 'Value': str(value)}], ['Key'])
@@ -1,7 +1,43 @@
+import functools
+import itertools
 import pandas as pd
-import sqlite3
 
 from ButterAndCrust.lib.DB.Tables.DBTable import DBTable
+from ButterAndCrust.lib.DB.ConnectionManager import ConnectionManager
+from ButterAndCrust.lib.DB.IndexManager import IndexManager
+
+@functools.lru_cache(maxsize=256)
+def build_statement(kind, table, columns=(), where=""):
+    """
+    Builds the sql text of a statement. Values are never part of the
+    text, they are bound as parameters, so repeats of a query have the
+    same text and reuse the statement compiled by the connection's
+    statement cache.
+
+    Args:
+        kind(``str``): one of SELECT, MAX, MIN, COUNT or DELETE
+        table(``str``): table name
+        columns(``tuple of str``, optional): columns to select, or the
+            column to aggregate
+        where(``str``, optional): where clause, with ? placeholders
+
+    Returns:
+        (``str``): sql statement
+    """
+    where_clause = " WHERE " + where if where else ""
+
+    if kind == "SELECT":
+        cols = ",".join(columns) if columns else "*"
+        return "SELECT {} FROM {}{}".format(cols, table, where_clause)
+
+    if kind in ("MAX", "MIN", "COUNT"):
+        col = columns[0] if columns else "*"
+        return "SELECT {}({}) FROM {}{}".format(kind, col, table, where_clause)
+
+    if kind == "DELETE":
+        return "DELETE FROM {}{}".format(table, where_clause)
+
+    raise ValueError("Unknown statement kind: {}".format(kind))
 
 class SQLTable(DBTable):
     """
@@ -9,7 +45,14 @@ class SQLTable(DBTable):
     Returns queries as pandas DataFrames.
     """
 
-    def __init__(self, table_name, columns, db_file, indices=[]):
+    # default SQLITE_MAX_VARIABLE_NUMBER of older sqlite builds
+    MAX_VARIABLES = 999
+
+    # rows fetched from sqlite at a time by the streaming reads
+    STREAM_CHUNK_SIZE = 10000
+
+    def __init__(self, table_name, columns, db_file, indices=[],
+                 profile=ConnectionManager.DEFAULT_PROFILE):
         """
         Instantiates a new instance of the SQLTable class. 
 
@@ -17,12 +60,17 @@ class SQLTable(DBTable):
             table_name(``str``): name of the table
             columns(``list of str``): column names
             db_file(``str``): filepath of the database
-            indices(``set of SQLTable.index``)
+            indices(``set of SQLTable.index``): declared indices, kept
+                in the db by index_manager
+            profile(``str``, optional): pragma profile of the 
+                connection, see ConnectionManager.PROFILES
         """
         super().__init__(table_name, columns)
-        self._conn = self.create_connection(db_file)
         self.db_file = db_file
-        self._indices = indices
+        self.profile = profile
+        self.connections = ConnectionManager.shared(db_file)
+        self._indices = list(indices)
+        self.index_manager = IndexManager(self)
 
     def _execute(self, sql, **parameters):
         """
@@ -61,7 +109,7 @@ class SQLTable(DBTable):
             new_table(``SQLTable``): Instance of SQLTable object 
         """
 
-        new_table = SQLTable(new_name, self.columns, self.db_file)
+        new_table = SQLTable(new_name, self.columns, self.db_file, profile=self.profile)
 
         where = "WHERE 1" if contents else "WHERE 0"
 
@@ -93,7 +141,7 @@ class SQLTable(DBTable):
 
         return new_table
 
-    def sql_to_df(self, sql):
+    def sql_to_df(self, sql, params=()):
         """
         Converts the output of a sql statement and returns it in a
         pandas dataframe.
@@ -101,100 +149,191 @@ class SQLTable(DBTable):
         Args:
             sql(``str``): sql statement
 
+        Keyword Args:
+            params(``tuple``, optional): parameters to bind to the sql
+                statement
+
         Returns:
             df(``DataFrame``) pandas dateframe of returned results
         """
 
-        df = pd.read_sql_query(sql, self.conn)
+        df = pd.read_sql_query(sql, self.conn, params=params)
         return df
 
-    def select(self, columns=[], where=""):
+    def iter_rows(self, sql, params=(), size=None):
+        """
+        Streams the rows of a sql statement, fetching size rows from
+        sqlite at a time so the full result is never held in memory.
+
+        Args:
+            sql(``str``): sql statement
+
+        Keyword Args:
+            params(``tuple``, optional): parameters to bind to the sql
+                statement
+            size(``int``, optional): rows to fetch at a time, default 
+                is STREAM_CHUNK_SIZE
+
+        Yields:
+            (``tuple``): each row of the result
+        """
+        cur = self.conn.execute(sql, params)
+
+        try:
+            while True:
+                rows = cur.fetchmany(size or self.STREAM_CHUNK_SIZE)
+
+                if not rows:
+                    break
+
+                yield from rows
+        finally:
+            cur.close()
+
+    def iter_chunks(self, sql, params=(), chunksize=None):
+        """
+        Streams the result of a sql statement as DataFrames of up to
+        chunksize rows. The first DataFrame is always yielded, so an
+        empty result still gives its columns.
+
+        Args:
+            sql(``str``): sql statement
+
+        Keyword Args:
+            params(``tuple``, optional): parameters to bind to the sql
+                statement
+            chunksize(``int``, optional): rows per DataFrame, default is
+                STREAM_CHUNK_SIZE
+
+        Yields:
+            (``DataFrame``): consecutive chunks of the result
+        """
+        chunksize = chunksize or self.STREAM_CHUNK_SIZE
+        cur = self.conn.execute(sql, params)
+
+        try:
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchmany(chunksize)
+
+            while True:
+                yield pd.DataFrame.from_records(rows, columns=columns, coerce_float=True)
+
+                rows = cur.fetchmany(chunksize)
+
+                if not rows:
+                    break
+        finally:
+            cur.close()
+
+    def select(self, columns=[], where="", params=()):
         """
         Executes a select statement.
 
         Keyword Args:
             columns(``list of str``, optional): list of column names to
-                query
-            where(``str``, optional): where clause to filter query
+                query, default is the table's columns
+            where(``str``, optional): where clause to filter query, with
+                ? placeholders for values
+            params(``tuple``, optional): parameters to bind to where
 
         To Do: 
             Change args to kwargs
         """
 
-        sql = '''
-            SELECT {cols} FROM {name} {where_clause}
-        '''.format(
-            cols=','.join(columns) if columns else '*',
-            name=self.name,
-            where_clause="WHERE " + where if where else ""
-        )
+        sql = build_statement("SELECT", self.name, tuple(columns or self.columns), where)
 
-        return self.sql_to_df(sql)
+        return self.sql_to_df(sql, params=params)
 
-    def max(self, column, where=""):
+    def select_chunks(self, columns=[], where="", params=(), chunksize=None):
+        """
+        Streams a select statement as DataFrames of up to chunksize
+        rows, see iter_chunks.
+
+        Keyword Args:
+            columns(``list of str``, optional): list of column names to
+                query, default is the table's columns
+            where(``str``, optional): where clause to filter query, with
+                ? placeholders for values
+            params(``tuple``, optional): parameters to bind to where
+            chunksize(``int``, optional): rows per DataFrame
+        """
+
+        sql = build_statement("SELECT", self.name, tuple(columns or self.columns), where)
+
+        return self.iter_chunks(sql, params=params, chunksize=chunksize)
+
+    def _fetch_value(self, sql, params=()):
+        """
+        Executes a query and returns the first value of the first row
+        """
+        return self.conn.execute(sql, params).fetchone()[0]
+
+    def max(self, column, where="", params=()):
         """
         Gets the max value of a column
 
         Args:
             column(``str``): column name to query
-        """
 
-        sql = (
-        '''
-            SELECT MAX({col}) FROM {table} {where_clause}
-        '''.format(
-            table=self.name,
-            col=column,
-            where_clause="WHERE " + where if where else ""
-            )
-        )
+        Keyword Args:
+            where(``str``, optional): where clause to filter query, with
+                ? placeholders for values
+            params(``tuple``, optional): parameters to bind to where
+        """
 
-        cur = self.conn.cursor()
+        sql = build_statement("MAX", self.name, (column,), where)
 
-        return cur.execute(sql).fetchall()[0][0]
+        return self._fetch_value(sql, params)
     
-    def min(self, column, where=""):
+    def min(self, column, where="", params=()):
         """
         Gets the min value of a column
 
         Args:
             column(``str``): column name to query
-        """
 
-        sql = (
-        '''
-            SELECT MIN({col}) FROM {table} {where_clause}
-        '''.format(
-            table=self.name,
-            col=column,
-            where_clause="WHERE " + where if where else ""
-            )
-        )
+        Keyword Args:
+            where(``str``, optional): where clause to filter query, with
+                ? placeholders for values
+            params(``tuple``, optional): parameters to bind to where
+        """
 
-        cur = self.conn.cursor()
+        sql = build_statement("MIN", self.name, (column,), where)
 
-        return cur.execute(sql).fetchall()[0][0]
-    
+        return self._fetch_value(sql, params)
 
-    def delete(self, where=""):
+    def delete(self, where="", params=()):
         """
         Deletes from table. 
 
         Args:
-            where(``str``, optional): where clause to filter query
+            where(``str``, optional): where clause to filter query, with
+                ? placeholders for values
+            params(``tuple``, optional): parameters to bind to where
 
         To Do:
             change args to kwargs
         """
 
-        sql = '''
-            DELETE FROM {name} {where_clause}
-        '''.format(
-            name=self.name,
-            where="WHERE " + where if where else ""
-        )
+        sql = build_statement("DELETE", self.name, (), where)
+
+        self._execute(sql, values=params)
+
+    def _insert_statement(self, columns):
+        """
+        Builds a parameterised insert statement for the given columns
+
+        Args:
+            columns(``list of str``): column names to insert
+        """
 
-        self.general_execute(sql, self.conn)
+        return """
+            INSERT INTO {table}({cols}) VALUES({vals});
+        """.format(
+            table=self.name,
+            cols=','.join(columns),
+            vals=("?,"*len(columns))[:-1]
+        )
 
     def insert(self, row):
         """
@@ -208,32 +347,88 @@ class SQLTable(DBTable):
         columns = row.keys()
         values = tuple([row[v] for v in row])
 
-        sql = """
-            INSERT INTO {table}({cols}) VALUES({vals});
-        """.format(
-            table=self.name,
-            cols=','.join(columns),
-            vals=("?,"*len(columns))[:-1]
-        )
+        sql = self._insert_statement(columns)
 
         self._execute(sql, values=values)
 
-    def insert_many(self, rows):
+    def _execute_many(self, build_sql, rows, batch_size):
         """
-        Inserts many rows to table.
+        Executes a statement for many rows with executemany, using a
+        single transaction per batch.
 
         Args:
-            rows(``list of dict``): list rows to insert.
-                Each row must be dictionary with column names as keys.
+            build_sql(``callable``): builds the sql statement from the
+                column names of the rows
+            rows(``iterable of dict``): rows to execute the statement for.
+                Each row must be dictionary with the same column names
+                as keys.
+            batch_size(``int``): number of rows to commit per transaction
+        """
+        rows = iter(rows)
+        batch = list(itertools.islice(rows, batch_size))
+
+        if not batch:
+            return
+
+        columns = list(batch[0].keys())
+        sql = build_sql(columns)
+
+        while batch:
+            values = [tuple([row[col] for col in columns]) for row in batch]
+
+            # commits on success and rolls back the batch on any error
+            with self.conn:
+                self.conn.executemany(sql, values)
+
+            batch = list(itertools.islice(rows, batch_size))
+
+    def insert_many(self, rows, batch_size=10000):
+        """
+        Inserts many rows to table. Rows are written with executemany
+        using a single transaction per batch.
+
+        Args:
+            rows(``iterable of dict``): rows to insert.
+                Each row must be dictionary with the same column names
+                as keys.
+
+        Keyword Args:
+            batch_size(``int``, optional): number of rows to commit per
+                transaction
+        """
+        self._execute_many(self._insert_statement, rows, batch_size)
+
+    def _upsert_statement(self, columns, key):
+        """
+        Builds a parameterised insert statement that updates the
+        existing row when it conflicts on key
+
+        Args:
+            columns(``list of str``): column names to insert
+            key(``list of str``): column names of a unique index
         """
-        for row in rows:
-            self.insert(row)
 
-    def sync(self, rows, key):
+        updates = [col + "=excluded." + col for col in columns if col not in key]
+
+        return """
+            INSERT INTO {table}({cols}) VALUES({vals})
+            ON CONFLICT({key}) DO {action};
+        """.format(
+            table=self.name,
+            cols=','.join(columns),
+            vals=("?,"*len(columns))[:-1],
+            key=','.join(key),
+            action="UPDATE SET " + ','.join(updates) if updates else "NOTHING"
+        )
+
+    def sync(self, rows, key, batch_size=10000):
         """
         Synchronise input values to a table. Will update existing rows
         if already exist. 
 
+        Rows are upserted in a single pass so key must match a unique
+        index of the table.
+
         Datetime values must be passed in as sql friendly strings, e.g. 
         dt.datetime(2021,2,6) -> '2021-02-06'
 
@@ -242,65 +437,28 @@ class SQLTable(DBTable):
                 Each row must be dictionary with column names as keys.
             key(``list of str``): column names for join key
 
+        Keyword Args:
+            batch_size(``int``, optional): number of rows to commit per
+                transaction
+
         To Do:
             Allow key(``str``, ``list``)
         """
 
-        # create temp table
-        temp_table = self.copy("TempTable")
+        self._execute_many(lambda columns: self._upsert_statement(columns, key),
+                           rows, batch_size)
 
-        try:
-            # insert all values to temp table
-            temp_table.insert_many(rows)
-
-            # update existing values in self
-            temp_cols = ",".join([temp_table.name + "." + col for col in self.columns])
-            key_str = " AND ".join([temp_table.name + "." + col + "=" + self.name + "." + col for col in key])
-            
-            sql = (
-                '''
-                REPLACE INTO {table}
-                ({cols})
-                SELECT {tempcols}
-                FROM {table} 
-                INNER JOIN {temptable} ON {key}
-                '''.format(
-                        table=self.name,
-                        cols=','.join(self.columns),
-                        tempcols=temp_cols,
-                        temptable=temp_table.name,
-                        key=key_str
-                    )
-            )
-
-            self._execute(sql)
-
-            # insert new values to self
-            sql = ('''
-                INSERT INTO {table} ({cols})
-                SELECT * FROM {temptable}
-                WHERE NOT EXISTS (
-                    SELECT * FROM {table} WHERE {key}
-                );
-                '''.format(
-                    table=self.name,
-                    cols=','.join(self.columns),
-                    temptable=temp_table.name,
-                    key=key_str
-                    )
-            )
 
-            self._execute(sql)
-            
-            # drop temp table when complete
-            temp_table._drop()
-
-        except:
-            # safely drop temp table if we hit any error after creation
-            temp_table._drop()
-            raise
+    def exists(self):
+        """
+        Checks whether the table exists in the db
+        """
+        df = self.sql_to_df(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name=?",
+            params=(self.name,)
+        )
+        return not df.empty
 
-    
     def create_index(self, name, key, is_unique=False):
         """
         Creates a non-unique index from a list of table columns
@@ -326,35 +484,23 @@ class SQLTable(DBTable):
                     index_cols=','.join(key))
 
         self._execute(sql)
-        self._indices.append(self.index(name, key, is_unique))
+
+        index = self.index(name, key, is_unique)
+        if index not in self._indices:
+            self._indices.append(index)
 
     @property
     def conn(self):
-        return self._conn
+        """
+        This thread's connection to the db, shared with every table on 
+        the same db file and profile
+        """
+        return self.connections.connection(self.profile)
 
     @property
     def indices(self):
         return self._indices
     
-    @staticmethod
-    def create_connection(db_file):
-        """ 
-        create a database connection to a SQLite database.
-
-        Args:
-            db_file(``str``): filepath of database
-
-        Returns:
-            conn(``sqlite connection obj``)
-        """
-        conn = None
-        try:
-            conn = sqlite3.connect(db_file)
-        except sqlite3.Error as e:
-            print(e)
-
-        return conn
-
     @staticmethod
     def general_execute(sql, db_conn, **parameters):
         """
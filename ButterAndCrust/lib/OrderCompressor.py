@@ -0,0 +1,192 @@
+import numpy as np
+import pandas as pd
+
+from ButterAndCrust.lib.items.OrderItems import Lineitems, SkuMap
+from ButterAndCrust.lib.Address import Address
+
+class OrderCompressor():
+    """
+    Columnar engine that compresses the lineitem rows of a raw Shopify
+    orders export into one row per order.
+
+    All of the per row work is done with groupby/aggregate operations on
+    the DataFrame so the cost is dominated by a handful of vectorised
+    passes rather than a python loop over every lineitem.
+    """
+
+    BILLING_COLUMNS = [
+        'Billing Name',
+        'Billing Street',
+        'Billing Address1',
+        'Billing Address2',
+        'Billing Company',
+        'Billing City',
+        'Billing Zip',
+        'Billing Province',
+        'Billing Country',
+        'Billing Phone'
+    ]
+
+    SHIPPING_COLUMNS = [
+        'Shipping Name',
+        'Shipping Street',
+        'Shipping Address1',
+        'Shipping Address2',
+        'Shipping Company',
+        'Shipping City',
+        'Shipping Zip',
+        'Shipping Province',
+        'Shipping Country',
+        'Shipping Phone'
+    ]
+
+    def __init__(self, delivery_date, is_fortnightly_coffee):
+        """
+        Instantiates a new instance of the OrderCompressor class
+
+        Args:
+            delivery_date(``datetime``): delivery date of input orders
+            is_fortnightly_coffee(``callable``): returns whether a
+                lineitem description is a fortnightly coffee
+        """
+        self.delivery_date = delivery_date
+        self._is_fortnightly_coffee = is_fortnightly_coffee
+
+        # SKUs of every chunk compressed by this instance
+        self.skus = SkuMap()
+
+    @staticmethod
+    def _is_blank(column):
+        """
+        Returns a boolean mask of the empty or whitespace only values
+        of a string column
+        """
+        blank = (column == "").to_numpy(dtype=bool, copy=True)
+
+        # most rows of an export are empty so only strip the rest
+        filled = ~blank
+        blank[filled] = column[filled].str.strip().to_numpy() == ""
+
+        return blank
+
+    def _last_non_blank(self, frame, codes):
+        """
+        Gets the last non blank value of each column for every order.
+        Orders with only blank values are given an empty string.
+
+        Args:
+            frame(``DataFrame``): string columns to aggregate
+            codes(``ndarray``): order code of each row
+        """
+        blanks = np.column_stack([self._is_blank(frame[col]) for col in frame])
+        return frame.where(~blanks).groupby(codes).last().fillna("")
+
+    def compress(self, input_orders, had_fortnightly_coffee):
+        """
+        Compresses the raw input orders.
+
+        Args:
+            input_orders(``DataFrame``): raw orders as read with
+                ``pd.read_csv(file, na_filter=False, dtype=str)``
+            had_fortnightly_coffee(``dict``): maps customer emails to
+                whether their previous order had a fortnightly coffee
+
+        Returns:
+            stock(``array``): quantity of each lineitem, indexed by the
+                SKUs of self.skus
+            compressed_rows(``list of dict``): one record per order
+        """
+
+        # factorize so each order is coded in order of first appearance
+        order_ids = input_orders['Name'].str[1:].astype(int)
+        codes, IDs = pd.factorize(order_ids)
+
+        if not len(IDs):
+            return np.zeros(len(self.skus), dtype="int64"), []
+
+        emails = input_orders['Email'].groupby(codes).first()
+
+        totals = input_orders['Total']
+        totals = pd.to_numeric(totals.where(~self._is_blank(totals)))
+        totals = totals.groupby(codes).sum()
+
+        notes = self._last_non_blank(input_orders[['Notes']], codes)['Notes']
+        notes = notes.where(notes != "", "N/A")
+
+        billing = self._last_non_blank(input_orders[self.BILLING_COLUMNS], codes)
+        shipping = self._last_non_blank(input_orders[self.SHIPPING_COLUMNS], codes)
+
+        # resolve each distinct lineitem once rather than once per row
+        names = input_orders['Lineitem name']
+        unique_names = names.unique()
+        catalog_items = {name: Lineitems.get(name) for name in unique_names}
+        skus = {name: self.skus.sku(item) for name, item in catalog_items.items()}
+        fortnightly = {
+            name: self._is_fortnightly_coffee(item.description)
+            for name, item in catalog_items.items()
+        }
+
+        # don't add fornightly coffee if they had it in their last order
+        had_fortnightly = emails.map(had_fortnightly_coffee).fillna(False)
+        skip = (names.map(fortnightly).to_numpy(dtype=bool)
+                & had_fortnightly.to_numpy(dtype=bool)[codes])
+
+        qty = input_orders['Lineitem quantity']
+        qty = qty.where(qty != "", "0").astype("int64")
+
+        keep = ~skip
+        items = pd.DataFrame({
+            'order': codes[keep],
+            'sku': names[keep].map(skus).to_numpy(dtype="int64"),
+            'quantity': qty[keep].to_numpy()
+        })
+
+        # stock required of each item is a single count over every order
+        stock = np.bincount(items['sku'], weights=items['quantity'],
+                            minlength=len(self.skus)).astype("int64")
+
+        # quantities per order in the order each item first appeared
+        items = (
+            items.groupby(['order', 'sku'], sort=False)['quantity']
+                .sum()
+                .reset_index()
+                .sort_values('order', kind='stable')
+        )
+
+        # stock is listed in the order items first appear in the orders
+        self.skus.count(items['sku'].unique())
+
+        # items are sorted by order so each order is a contiguous slice
+        descriptions = items['sku'].map({sku: item.description for sku, item in
+                                         zip(skus.values(), catalog_items.values())})
+        pieces = (descriptions + "|").str.repeat(items['quantity']).tolist()
+        bounds = np.searchsorted(items['order'].to_numpy(), np.arange(len(IDs) + 1))
+        lineitems = [
+            "".join(pieces[start:end])[:-1]
+            for start, end in zip(bounds[:-1], bounds[1:])
+        ]
+
+        delivery_date = self.delivery_date.strftime("%Y-%m-%d")
+        compressed_rows = [{
+                "ID": orderID,
+                "Email": email,
+                "DeliveryDate": delivery_date,
+                "Lineitems": items_str,
+                "BillingAddress": str(Address(*billing_info)),
+                "ShippingAddress": str(Address(*shipping_info)),
+                "Total": float(total),
+                "DeliveryNotes": note
+            }
+            for orderID, email, items_str, billing_info, shipping_info, total, note
+            in zip(
+                IDs.tolist(),
+                emails.to_numpy(dtype=object).tolist(),
+                lineitems,
+                billing.to_numpy(dtype=object).tolist(),
+                shipping.to_numpy(dtype=object).tolist(),
+                totals.tolist(),
+                notes.to_numpy(dtype=object).tolist()
+            )
+        ]
+
+        return stock, compressed_rows
@@ -1,11 +1,14 @@
 import datetime as dt
+import numpy as np
 import pandas as pd
 
 import ButterAndCrust.lib.General.Exceptions as e
-from ButterAndCrust.lib.items.OrderItems import Lineitems
 import ButterAndCrust.lib.General.FileQueries as FQ
-from ButterAndCrust.lib.Order import Order
-from ButterAndCrust.lib.Address import Address
+from ButterAndCrust.lib.OrderCompressor import OrderCompressor
+from ButterAndCrust.lib.items.OrderItems import Lineitems
+
+# compressed rows held before syncing when the input is streamed
+DEFAULT_BATCH_SIZE = 10000
 
 class OrderProcessor():
     """
@@ -50,20 +53,35 @@ class OrderProcessor():
 
         return date
 
-    def _is_fortnightly_coffee(self, text):
+    @staticmethod
+    def _is_fortnightly_coffee(text):
         """
         Determines whether an item string is fornightly coffee lineitem
 
         Args:
-            text(``str``): text to check
+            text(``str``): text to check, a lineitem description or a
+                "|" separated list of them
         """
-        item = text.lower()
-        return ("coffee" in item
-                and ("every fortnight" in item
-                or "every other week" in item)
-                )
+        return any(Lineitems.get(desc).is_fortnightly for desc in text.split("|"))
+
+    def _fortnightly_coffee_index(self, prev_orders):
+        """
+        Compiles each customers most recent order into an exact lookup of
+        whether they had a fortnightly coffee last time.
+
+        Args:
+            prev_orders(``DataFrame``): each customers most recent order
+
+        Returns:
+            (``dict``): email to whether they had fortnightly coffee
+        """
+        if prev_orders.empty:
+            return dict()
+
+        prev_fortnightly = prev_orders['Lineitems'].apply(func=self._is_fortnightly_coffee)
+
+        return prev_fortnightly.groupby(prev_orders['Email'].to_numpy()).any().to_dict()
 
-    
     def _check_last_delivery(self):
         """
         Checks if the last processed delivery date was more than a week ago 
@@ -89,7 +107,42 @@ class OrderProcessor():
                 if not self._testing:
                     e.throw_warning(err)
 
-    def process_orders(self, outfile):
+    def _read_orders(self, chunksize=None):
+        """
+        Reads the raw orders csv and yields DataFrames that only contain
+        complete orders.
+
+        Relies on the rows of each order Name being contiguous so the
+        trailing order of a chunk is carried over until its rows end.
+
+        Keyword Args:
+            chunksize(``int``, optional): number of rows to read at a
+                time. Reads the whole file at once if None
+        """
+        if chunksize is None:
+            yield pd.read_csv(self.infile, na_filter=False, dtype=str)
+            return
+
+        carry = None
+        reader = pd.read_csv(self.infile, na_filter=False, dtype=str,
+                             chunksize=chunksize)
+
+        for chunk in reader:
+            if carry is not None:
+                chunk = pd.concat([carry, chunk], ignore_index=True)
+
+            names = chunk['Name'].to_numpy()
+            other_orders = np.flatnonzero(names != names[-1])
+            split = other_orders[-1] + 1 if len(other_orders) else 0
+
+            if split:
+                yield chunk.iloc[:split]
+            carry = chunk.iloc[split:]
+
+        if carry is not None:
+            yield carry
+
+    def process_orders(self, outfile, chunksize=None, batch_size=None):
         """
         Processes the orders:
             - compresses and syncs orders to self.orders_table
@@ -97,121 +150,52 @@ class OrderProcessor():
 
         Args:
             outfile(``str``): filepath of the output stock requirements
+
+        Keyword Args:
+            chunksize(``int``, optional): stream the input csv this many
+                rows at a time rather than loading it all at once
+            batch_size(``int``, optional): max number of compressed rows
+                to hold before syncing them to self.orders_table,
+                DEFAULT_BATCH_SIZE when the input is streamed
         """
+
+        if chunksize and batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZE
         
         # before we process orders check the chronology of the previous ones
         self._check_last_delivery()
 
-        orders = dict()
-        total_items = dict()
-        input_orders = pd.read_csv(self.infile, na_filter=False)
-
         prev_orders = self.orders_table.get_most_recent_order_by_email(current_date=self.delivery_date)
 
-        # Process orders into a list of Order() objects so they're managable
-        #==========================================================================
-        for _, row in input_orders.iterrows():
-
-            orderID = int(row['Name'][1:])
-
-            # create a new Order() if this is a new orderID
-            if orderID not in orders:
-                orders[orderID] = Order(orderID, row['Email'])
-
-            # get customers previous order if there is any
-            prev_order = prev_orders[prev_orders['Email'].str.contains(orders[orderID].email)]
-
-            orders[orderID].delivery_date = self.delivery_date
-
-            if row['Total'] and not row['Total'].isspace():
-                orders[orderID].update_total(float(row['Total']))
-
-            if row['Notes'] and not row['Notes'].isspace():
-                orders[orderID].notes = row['Notes']
-            
-            item_qty_str = row['Lineitem quantity']
-            item_qty = int(item_qty_str) if item_qty_str else 0
-            item_price_str = row['Lineitem price']
-            item_price = float(item_price_str) if item_price_str else 0.0
-            item = Lineitems.get(row['Lineitem name'])
-
-            if not (self._is_fortnightly_coffee(item.description)
-                and prev_order['Lineitems'].apply(func=self._is_fortnightly_coffee).any()
-                ):
-                # don't add fornightly coffee if they had it in their last order
-                orders[orderID].add_lineitem(item, item_price, item_qty)
-            
-            billing_info = Address(
-                                    row['Billing Name'],
-                                    row['Billing Street'],
-                                    row['Billing Address1'],
-                                    row['Billing Address2'],
-                                    row['Billing Company'],
-                                    row['Billing City'],
-                                    row['Billing Zip'],
-                                    row['Billing Province'],
-                                    row['Billing Country'],
-                                    row['Billing Phone']
-                                )
-            orders[orderID].add_billing_info(billing_info)
-
-            shipping_info = Address(
-                                    row['Shipping Name'],
-                                    row['Shipping Street'],
-                                    row['Shipping Address1'],
-                                    row['Shipping Address2'],
-                                    row['Shipping Company'],
-                                    row['Shipping City'],
-                                    row['Shipping Zip'],
-                                    row['Shipping Province'],
-                                    row['Shipping Country'],
-                                    row['Shipping Phone']
-                                )
-            orders[orderID].add_shipping_info(shipping_info)
-        #==========================================================================
-
-        # Sync orders to the CompressedOrderHistory DB Table and save each order
-        # to a file.
-        # Technically this is inefficient as we are iterating over orders twice
-        # but for small set this should be ok for now
-        #==========================================================================
-        compressed_rows = []
-
-        for orderID in orders:
-            order = orders[orderID]      
-            lineitems = ""
-
-            # format lineitems for table
-            for item in order.lineitems:
-                qty = order.lineitems[item]['quantity']
-
-                if item in total_items:
-                    total_items[item] += qty
-                else:
-                    total_items[item] = qty
-
-                for _ in range(qty):
-                    lineitems += item + "|"
-
-            lineitems = lineitems[:-1]
-            compressed_rows += [{
-                "ID": orderID, 
-                "Email": order.email,
-                "DeliveryDate": order.delivery_date.strftime("%Y-%m-%d"),
-                "Lineitems": lineitems,
-                "BillingAddress": str(order.billing_info),
-                "ShippingAddress": str(order.shipping_info),
-                "Total": order.total,
-                "DeliveryNotes": order.notes
-            }]
-            
-        FQ.write_dict_to_csv(["Lineitem", "Quantity"], total_items, outfile)
+        compressor = OrderCompressor(self.delivery_date, self._is_fortnightly_coffee)
+        had_fortnightly_coffee = self._fortnightly_coffee_index(prev_orders)
+
+        stock = np.zeros(0, dtype="int64")
+        pending_rows = []
+
+        for input_orders in self._read_orders(chunksize):
+            chunk_stock, compressed_rows = compressor.compress(input_orders,
+                                                               had_fortnightly_coffee)
 
-        # sync values to db table
-        self.orders_table.sync_by_ID(compressed_rows)
+            # unmatched items seen in later chunks extend the SKU range
+            if len(chunk_stock) > len(stock):
+                stock = np.pad(stock, (0, len(chunk_stock) - len(stock)))
+            stock[:len(chunk_stock)] += chunk_stock
+
+            pending_rows += compressed_rows
+
+            # sync values to db table in bounded batches
+            if batch_size and len(pending_rows) >= batch_size:
+                synced = len(pending_rows) - len(pending_rows) % batch_size
+                for i in range(0, synced, batch_size):
+                    self.orders_table.sync_by_ID(pending_rows[i : i + batch_size])
+                del pending_rows[:synced]
+
+        if pending_rows:
+            self.orders_table.sync_by_ID(pending_rows)
+
+        total_items = Lineitems.stock_to_dict(stock, compressor.skus)
+
+        FQ.write_dict_to_csv(["Lineitem", "Quantity"], total_items, outfile)
 
         return total_items
-        #==========================================================================
-    
-    
-    
@@ -15,9 +15,19 @@ DB_BASE_PATH = "C:/Users/dylan/Documents/Programming/ButterAndCrust/DB/"
 ORDERS_DB_NAME = "OrderHistory"
 COLD_STORAGE_ORDERS_DB_LOC = DB_BASE_PATH + ORDERS_DB_NAME + ".db"
 
+# Location of the local read-through mirror of the airtable order history
+MIRROR_DB_LOC = DB_BASE_PATH + ORDERS_DB_NAME + "Mirror.db"
+
 # Must install [https://github.com/wkhtmltopdf/wkhtmltopdf/releases/download/0.12.4/wkhtmltox-0.12.4_msvc2015-win64.exe]
 PATH_WKHTMLTOPDF = "C:/Program Files/wkhtmltopdf/bin/wkhtmltopdf.exe"
 
+# Extra wkhtmltopdf options. Packing slip images are local files, which
+# wkhtmltopdf 0.12.6+ blocks unless local file access is enabled
+WKHTMLTOPDF_OPTIONS = {"enable-local-file-access": None}
+
+# Cache of rendered packing slip pdfs, reused when re-running a delivery
+PACKING_SLIP_CACHE_DIR = DB_BASE_PATH + "PackingSlipCache/"
+
 # Default output location for package slips and stock requirements 
 # this can also be changed on the command line
 DEFAULT_OUTPUT_LOCATION = "C:/Users/dylan/Documents/test/"
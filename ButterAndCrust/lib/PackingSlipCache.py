@@ -0,0 +1,97 @@
+import datetime as dt
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+class PackingSlipCache():
+    """
+    Persistent cache of rendered packing slip pdfs, so re-running the
+    packing slips for a delivery date only renders what has changed.
+
+    A pdf is keyed by the hash of each slip's html, which is built from
+    the order fields, lineitems, route and stop, together with the
+    template style and wkhtmltopdf options. Any change to those inputs
+    gives a new key.
+
+    :param cache_dir:           (str) directory to keep cached pdfs in
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def slip_hash(html):
+        """
+        Hash of a single rendered packing slip
+        """
+        return hashlib.sha256(html.encode()).hexdigest()
+
+    def key(self, packing_slips, style="", options=None):
+        """
+        Builds the cache key of a pdf
+
+        Args:
+            packing_slips(``list``): html of each slip in the pdf, in order
+            style(``str``, optional): template style shared by the slips
+            options(``dict``, optional): wkhtmltopdf options
+
+        Returns:
+            (``str``): cache key
+        """
+        digest = hashlib.sha256()
+        digest.update(self.slip_hash(style).encode())
+        digest.update(json.dumps(options or {}, sort_keys=True).encode())
+
+        for html in packing_slips:
+            digest.update(self.slip_hash(html).encode())
+
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ".pdf")
+
+    def get(self, key, outfile):
+        """
+        Copies the cached pdf for key to outfile.
+
+        Returns:
+            (``bool``): whether the pdf was in the cache
+        """
+        path = self._path(key)
+
+        if not os.path.exists(path):
+            return False
+
+        shutil.copyfile(path, outfile)
+
+        # keep recently used pdfs from being pruned
+        os.utime(path)
+
+        return True
+
+    def put(self, key, pdf_file):
+        """
+        Adds a rendered pdf to the cache
+        """
+        path = self._path(key)
+        tmp_path = path + ".tmp{}_{}".format(os.getpid(), threading.get_ident())
+
+        # copy then rename so a failed copy never leaves a partial pdf
+        shutil.copyfile(pdf_file, tmp_path)
+        os.replace(tmp_path, path)
+
+    def prune(self, max_age=dt.timedelta(days=28)):
+        """
+        Deletes cached pdfs that haven't been used within max_age
+        """
+        cutoff = time.time() - max_age.total_seconds()
+
+        for filename in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, filename)
+
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
@@ -1,84 +1,173 @@
 from django.utils.crypto import get_random_string
-import shutil
+import itertools
 import os
 import pandas as pd 
 import datetime as dt
 import pdfkit
+from concurrent.futures import ThreadPoolExecutor
 
-from ButterAndCrust.lib.General.WorkingDirectoryManager import WorkingDirectoryManager
 import ButterAndCrust.lib.General.Exceptions as e
 from ButterAndCrust.lib.Order import Order
-import ButterAndCrust.lib.General.FileQueries as FQ
 from ButterAndCrust.lib.items.OrderItems import Lineitems
+from ButterAndCrust.lib.templates.CompiledTemplate import CompiledTemplate
+from ButterAndCrust.lib.templates.AssetCache import AssetCache
 
 class PackingSlipManager():
     """
     A class that safely managers and builds packing slips in the 
     order deliveries are made.
 
+    Packing slips are built in memory and streamed straight to 
+    wkhtmltopdf, up to slips_per_pdf slips per pdf with each pdf holding
+    a single route. Each pdf is rendered by its own wkhtmltopdf process
+    with up to max_workers running at once.
+
     
     :param output_file:         (str) full filepath to save the full 
                                 pdf of the packingslips
-    :param working_dir:         (str) a temporary working directory. 
-                                Ensure this is a safe location to be 
-                                deleted
-    :param template:            (str) The html template of the packing slip
+    :param template:            (str) The html template of the packing 
+                                slip, compiled once on init
     :param wkhtml_exe_path:     (str) file path to the wkhtml executable
+    :param slips_per_pdf:       (int, optional) max number of packing 
+                                slips per pdf
+    :param max_workers:         (int, optional) max number of pdfs to 
+                                render at once, default is the number 
+                                of cpus
+    :param assets:              (AssetCache, optional) resolves template
+                                images to local files
+    :param wkhtml_options:      (dict, optional) extra wkhtmltopdf 
+                                options
+    :param cache:               (PackingSlipCache, optional) cache of 
+                                rendered pdfs, pdfs with unchanged 
+                                packing slips are copied from the cache
+                                rather than rendered
     """
 
-    def __init__(self, output_file, working_dir, template, wkhtml_exe_path):
-        self.working_directory = working_dir
+    SLIPS_PER_PDF = 100
+
+    # starts each packing slip on a new page
+    PAGE_BREAK = '<div style="page-break-after: always;"></div>'
+
+    # images, to turn them back on also render the item template with
+    # lineitem_image=self.assets.resolve(item.img)
+    # <div class="flex-line-item-img">
+    # <div class="aspect-ratio aspect-ratio-square" style="width: 58px; height: 58px;">
+    # <img src="{lineitem_image}" style="width: 58px; height: 58px;">
+    # </div>
+    # </div>
+
+    ITEM_TEMPLATE = CompiledTemplate('''        
+        <div class="flex-line-item">
+        <div class="flex-line-item-description">
+        <p>
+        <span class="line-item-description-line">
+        {lineitem}
+        </span>
+        </p>
+        </div>
+        <div class="flex-line-item-quantity">
+        <p class="text-align-right">
+        {lineitem_qty}
+        </p>
+        </div>
+        </div>
+        ''')
+
+    def __init__(self, output_file, template, wkhtml_exe_path,
+                 slips_per_pdf=SLIPS_PER_PDF, max_workers=None, assets=None,
+                 wkhtml_options=None, cache=None):
         self.outfile = output_file
-        self.html_template = template
+        self.assets = assets or AssetCache()
+        self.html_template = CompiledTemplate(self.assets.resolve_html(template))
+        self.wkhtml_options = wkhtml_options
+        self.cache = cache
         self.wkhtml_exe_path = wkhtml_exe_path
+        self.slips_per_pdf = slips_per_pdf
+        self.max_workers = max_workers or os.cpu_count() or 1
+
+    def _chunk(self, packing_slips):
+        """
+        Breaks sorted packing slips into the chunks rendered to each pdf.
+
+        Chunks never span routes and within a route hold a fixed range 
+        of slips_per_pdf stop numbers, orders without a route a fixed 
+        range of order IDs. Moving, adding or removing an order then 
+        only changes the chunks of the routes it is in, however many 
+        slips come before it.
+        """
+        def block(slip):
+            route, stop, _ = slip
+            return route, (stop - 1) // self.slips_per_pdf
 
-    def _chunk(self, iterable, chunk_size):
-        """Break iterable into chunks."""
-        for i in range(0, len(iterable), chunk_size):
-            yield iterable[i : i + chunk_size]
+        return [list(chunk) for _, chunk in itertools.groupby(packing_slips, key=block)]
 
     def produce_packing_slips(self, delivery_date, route_order_file, order_table):
         """
         Produces the packing slips for a given delivery date and route 
-        orders. Whilst safely handling the WorkingDirectory
+        orders.
 
         Args:
             delivery_date(``datetime``): date of delivery
             route_order_file(``str``, csv): file containing information 
                 about the order deliveries are made. Required columns: 
-                ['Bike', 'Route', 'Stop on Route']
-            db_file(``str``, db file) filepath to db
- 
+                ['Order_Number', 'Rider', 'Stop on Route']
+            order_table(``ICompressedOrderHistory``): table of orders
         """
 
-        with WorkingDirectoryManager(self.working_directory) as working_dir:
+        packing_slips = self.build_packing_slips(delivery_date, route_order_file,
+                                                 order_table)
+
+        # pdfs are numbered in delivery order
+        jobs = [
+            ([html for _, _, html in slip_chunk], self.outfile + "_{num}.pdf".format(num=i))
+            for i, slip_chunk in enumerate(self._chunk(packing_slips))
+        ]
 
-            self._produce_packing_slips(delivery_date, route_order_file,
-                                        working_dir, order_table)
+        # wkhtmltopdf runs in its own process so threads are enough to
+        # render the pdfs in parallel
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            list(pool.map(lambda job: self._render_or_copy(*job), jobs))
 
-    def _produce_packing_slips(self, delivery_date, route_order_file, working_dir, order_table):
+    def _render_or_copy(self, packing_slips, outfile):
         """
-        Produces the packing slips for a given delivery date and route 
-        orders.
+        Copies the pdf from the cache if none of its packing slips have
+        changed, otherwise renders it and adds it to the cache
+        """
+        if self.cache is None:
+            self.render_html_to_pdf(packing_slips, outfile)
+            return
+
+        key = self.cache.key(packing_slips, self.html_template.style, self.wkhtml_options)
+
+        if not self.cache.get(key, outfile):
+            self.render_html_to_pdf(packing_slips, outfile)
+            self.cache.put(key, outfile)
+
+    def build_packing_slips(self, delivery_date, route_order_file, order_table):
+        """
+        Builds the html packing slips for a given delivery date and 
+        route orders.
 
         Args:
             delivery_date(``datetime``): date of delivery
             route_order_file(``str``, csv): file containing information 
                 about the order deliveries are made. Required columns: 
-                ['Bike', 'Route', 'Stop on Route']
-            working_dir(``WorkingDirectorManager``) working directory 
-                encapsulated by the working directory manager
-            db_file(``str``, db file) filepath to db
+                ['Order_Number', 'Rider', 'Stop on Route']
+            order_table(``ICompressedOrderHistory``): table of orders
+
+        Returns:
+            (``list``): (route, stop, html) of each packing slip, sorted
+                in the order of deliveries. Orders without a route come
+                first, by order ID in place of the stop number.
         """
 
         route_orders = pd.read_csv(route_order_file, na_filter=False)
-
-        # delete any old contents before using working directory
-        working_dir.clear_working_dir()
+        packing_slips = []
 
         fdate = delivery_date + dt.timedelta(days=1)
         idate = delivery_date
         orders = order_table.get_all_by_delivery_date(idate, fdate)
+        orders = self._join_route_orders(orders, route_orders, route_order_file)
 
         for _, ordr in orders.iterrows():
             
@@ -95,141 +184,143 @@ class PackingSlipManager():
                 item = Lineitems.get(item_desc)
                 order.add_lineitem(item, 0.0, 1)
 
-            # get the route order info for this orderID
-            route_order = route_orders.loc[route_orders['Order_Number'] == order.ID]
-
-            # check that only one row per orderID exists in route order file
-            if len(route_order.index) == 0:
-                e.throw_warning('''
-                There are no rows for order #{orderid} in {filename}
-                '''.format(orderid=order.ID, filename=route_order_file)
-                )
-                
-                order_filename = str(order.ID) + ".html"
+            if not ordr['HasRoute']:
+                slip_key = ("", order.ID)
             else:
-                if len(route_order.index) > 1:
-                    e.throw_warning(
-                    '''
-                    There are {num} rows for order #{orderid} in {filename}\n. 
-                    Expected only 1 row per order.\n
-                    If continue we will use the first order only.\n
-                    '''.format(
-                        num=len(route_order.index),
-                        orderid=order.ID,
-                        filename=route_order_file
-                        )
-                    )
+                order.route_name = ordr['Rider']
+                raw_stop_number = int(ordr['StopNumber'])
 
-                route_order = route_orders.loc[route_orders['Tracking_ID'] == order.ID].iloc[0]
-
-                order.route_name = route_order['Rider']
-                stop_on_route = route_order['Stop on Route']
-
-                # safely process stop numbers
-                try:
-                    raw_stop_number = int(stop_on_route)
-                except:
-                    e.throw_warning(
-                    '''
-                    Cannot understand Stop on Route: {route_order}, for
-                    order #{orderid}. If continiure, will use Stop on
-                    Route: 1
-                    '''.format(
-                            route_order=stop_on_route,
-                            orderid=order.ID
-                        )
-                    )
-                    raw_stop_number = "00"
-            
-                # create an order filename that will be sortable in the 
-                # order of deliveries
+                # stops are sorted as numbers, the padding is only shown
+                # on the packing slip
                 order.stop_on_route = str(raw_stop_number) if raw_stop_number > 9 else "0" + str(raw_stop_number)
-                order_filename = order.route_name + "_" + order.stop_on_route + ".html"
-                order_filename = order_filename.replace(" ", "_")
-                order_filename = order_filename.replace("/", "of")
-            
-            # if something has gone wrong and order filename is still
-            # blank just name it orderID
-            if not order_filename or order_filename.isspace():
-                order_filename = str(order.ID) + ".html"
+                slip_key = (order.route_name, raw_stop_number)
+
+            # if something has gone wrong and the route is still blank
+            # sort by orderID
+            if not slip_key[0] or slip_key[0].isspace():
+                slip_key = ("", order.ID)
 
             # generate html of the packing slip for each order
             order_html = self.build_order_packing_slip(order, self.html_template)          
 
-            FQ.save_file(
-                        order_html,
-                        working_dir.path,
-                        order_filename
-                    )
+            packing_slips.append(slip_key + (order_html,))
+
+        # sort so they are rendered in delivery order
+        packing_slips.sort(key=lambda slip: slip[:2])
+
+        return packing_slips
+
+    def _join_route_orders(self, orders, route_orders, route_order_file):
+        """
+        Joins the route order info onto the orders by order number, 
+        warning once about every order that is missing from the route 
+        orders, has more than one row or has a stop on route that can't
+        be understood.
 
-        # create a list of all html files we have generated
-        all_html_files = ([working_dir.path + f for f in os.listdir(working_dir.path)
-                           if f.lower().endswith('.html')])
-        
-        # sort filenames so they are rendered in delivery order
-        all_html_files.sort()
+        Args:
+            orders(``DataFrame``): orders to deliver
+            route_orders(``DataFrame``): route order file contents
+            route_order_file(``str``): filepath of the route order file
 
-        for i, file_chunk in enumerate(self._chunk(all_html_files, 100)):
-            self.render_html_files_to_pdf(file_chunk, self.outfile + "_{num}.pdf".format(num=i))
+        Returns:
+            (``DataFrame``): orders with the Rider, StopNumber and 
+                HasRoute columns added
+        """
+        order_numbers = pd.to_numeric(route_orders['Order_Number'], errors='coerce')
+        route_orders = route_orders.assign(ID=order_numbers).dropna(subset=['ID'])
+        route_orders['ID'] = route_orders['ID'].astype(int)
+
+        order_IDs = orders['ID'].astype(int)
+        route_counts = route_orders['ID'].value_counts()
+        route_counts = route_counts[route_counts.index.isin(order_IDs)]
+
+        missing = order_IDs[~order_IDs.isin(route_counts.index)]
+        if len(missing.index):
+            e.throw_warning(
+            '''
+            There are no rows for orders {orderids} in {filename}
+            '''.format(
+                    orderids=", ".join("#" + str(ID) for ID in missing),
+                    filename=route_order_file
+                )
+            )
+
+        duplicates = route_counts[route_counts > 1]
+        if len(duplicates.index):
+            e.throw_warning(
+            '''
+            There are multiple rows for orders {orderids} in {filename}\n. 
+            Expected only 1 row per order.\n
+            If continue we will use the first row only.\n
+            '''.format(
+                    orderids=", ".join("#{} ({} rows)".format(ID, num) 
+                                       for ID, num in duplicates.items()),
+                    filename=route_order_file
+                )
+            )
+
+        route_orders = route_orders.drop_duplicates(subset=['ID'], keep='first')
+        route_orders = route_orders[['ID', 'Rider', 'Stop on Route']]
+
+        orders = orders.assign(ID=order_IDs).merge(route_orders, on='ID', how='left',
+                                                   indicator=True)
+        orders['HasRoute'] = orders.pop('_merge') == 'both'
+
+        # safely process stop numbers
+        stop_numbers = pd.to_numeric(orders['Stop on Route'], errors='coerce')
+        unknown_stops = orders['HasRoute'] & (stop_numbers.isna() | (stop_numbers % 1 != 0))
+        if unknown_stops.any():
+            e.throw_warning(
+            '''
+            Cannot understand Stop on Route for orders {orders}. If 
+            continue, will use Stop on Route: 1
+            '''.format(
+                    orders=", ".join(
+                        "#{} ({})".format(ID, stop) for ID, stop in 
+                        orders.loc[unknown_stops, ['ID', 'Stop on Route']].itertuples(index=False)
+                    )
+                )
+            )
 
-        # delete contents once finished with them
-        working_dir.clear_working_dir()
+        orders['StopNumber'] = stop_numbers.where(~unknown_stops, 1)
+
+        return orders
 
     def build_order_packing_slip(self, order, html_template):
         """
         Builds a packing slip for an input order and html template
 
         :param order:           (Order) object
-        :param html_template:   (str) formattable string of html template
+        :param html_template:   (CompiledTemplate or str) html template,
+                                without its style
         """
 
-        # images
-        # <div class="flex-line-item-img">
-        # <div class="aspect-ratio aspect-ratio-square" style="width: 58px; height: 58px;">
-        # <img src="{lineitem_image}" style="width: 58px; height: 58px;">
-        # </div>
-        # </div>
+        if not isinstance(html_template, CompiledTemplate):
+            html_template = CompiledTemplate(html_template)
 
-        item_context = '''        
-        <div class="flex-line-item">
-        <div class="flex-line-item-description">
-        <p>
-        <span class="line-item-description-line">
-        {lineitem}
-        </span>
-        </p>
-        </div>
-        <div class="flex-line-item-quantity">
-        <p class="text-align-right">
-        {lineitem_qty}
-        </p>
-        </div>
-        </div>
-        '''
-
-        item_str = ""
+        item_strs = []
 
         for desc in order.lineitems:
 
+            item = order.lineitems[desc]['item']
+
             # ignore any subscription items from packing slip
-            if "subscription" not in desc.lower():
-                item = order.lineitems[desc]['item']
+            if not item.is_subscription:
                 qty = order.lineitems[desc]['quantity']
                 item_desc = item.friendly_desc if qty == 1 else "<strong><u>" + item.friendly_desc + "</u></strong>"
                 qty_str = str(qty) if qty == 1 else "<strong><u>" + str(qty) + "</u></strong>"
 
-                item_str += item_context.format(
-                                                # lineitem_image=item.img,
+                item_strs.append(self.ITEM_TEMPLATE.render(
                                                 lineitem=item_desc,
                                                 lineitem_qty=qty_str,
-                                            )
+                                            ))
 
-        return html_template.format(
+        return html_template.render(
                     orderID=order.ID,
                     delivery_date=order.delivery_date.date(),
                     shipping_address=order.shipping_info,
                     billing_address=order.billing_info,
-                    lineitems=item_str,
+                    lineitems="".join(item_strs),
                     ordernotes=order.notes,
                     shop_name="Butter & Crust",
                     shop_email="support@butterandcrust.com",
@@ -238,15 +329,20 @@ class PackingSlipManager():
                     stopnumber=order.stop_on_route,
                     routename=order.route_name
         )
-    
 
-    def render_html_files_to_pdf(self, infiles, outfile):
+    def render_html_to_pdf(self, packing_slips, outfile):
         """
-        Renders a list of html files to pdf
+        Renders a list of html packing slips to a single pdf, streaming
+        the html to wkhtmltopdf over stdin
 
-        :param infiles:                 (list) of html filepaths to render
+        :param packing_slips:           (list) of html strings to render,
+                                        without the template style
         :param outfile:                 (str) filepath of pdf output
         """
 
+        # the style is shared by every packing slip so is only written once
+        html = self.html_template.style + self.PAGE_BREAK.join(packing_slips)
+
         config = pdfkit.configuration(wkhtmltopdf=self.wkhtml_exe_path)
-        pdfkit.from_file(infiles, outfile, configuration=config)
+        pdfkit.from_string(html, outfile, configuration=config,
+                           options=self.wkhtml_options)
@@ -1,8 +1,46 @@
 import os
 import posixpath
+import functools
 
 from ButterAndCrust.lib.PackageConfig import IMG_DIR
 
+# max number of unmatched items kept for reuse by Lineitems.get
+FALLBACK_CACHE_SIZE = 1024
+
+def _normalise(description):
+    """
+    Folds case and whitespace so descriptions match regardless of either
+    """
+    return " ".join(description.split()).casefold()
+
+def _item_attributes(description):
+    """
+    Parses the product, roast, grind and cadence out of a description.
+    Coffee descriptions take the form 
+    "<product> - <roast> / <grind> / <size> <cadence>", anything else is
+    just a product.
+
+    Returns:
+        (``dict``): attributes of the item, None if not applicable
+    """
+    attributes = dict(product=description, roast=None, grind=None, cadence=None)
+    text = description.lower()
+
+    if "coffee" in text and " - " in description:
+        product, options = description.split(" - ", 1)
+        options = [o.strip() for o in options.split(" / ")]
+        attributes['product'] = product.strip()
+
+        if len(options) == 3:
+            attributes['roast'], attributes['grind'] = options[:2]
+
+    for cadence in ("every other week", "every fortnight", "per week"):
+        if cadence in text:
+            attributes['cadence'] = cadence
+            break
+
+    return attributes
+
 class _BaseItem(object):
     """
     Base lineitem class
@@ -11,6 +49,7 @@ class _BaseItem(object):
         description(``str``): description of item
         price(``float``, optional): price of item
         img(``str``, optional): file path to image of item 
+        sku(``int``): integer id of the item
     """
 
     def __init__(self, desc, price=None, img=None):
@@ -25,6 +64,14 @@ class _BaseItem(object):
         self._description = desc
         self._price = price
         self._img = img
+        self._sku = getattr(self, "SKU", None)
+
+        # parsed once so callers can read flags rather than search text
+        self._attributes = _item_attributes(desc)
+        text = desc.lower()
+        self._is_coffee = "coffee" in text
+        self._is_fortnightly = self._is_coffee and self.cadence in ("every other week", "every fortnight")
+        self._is_subscription = "subscription" in text
 
     def __eq__(self, other):
         """
@@ -56,6 +103,45 @@ class _BaseItem(object):
     def img(self):
         return self._img
 
+    @property
+    def sku(self):
+        """
+        Integer id of a catalog item, None for unmatched items which are
+        given a SKU per run by a SkuMap
+        """
+        return self._sku
+
+    @property
+    def product(self):
+        return self._attributes['product']
+
+    @property
+    def roast(self):
+        return self._attributes['roast']
+
+    @property
+    def grind(self):
+        return self._attributes['grind']
+
+    @property
+    def cadence(self):
+        return self._attributes['cadence']
+
+    @property
+    def is_coffee(self):
+        return self._is_coffee
+
+    @property
+    def is_fortnightly(self):
+        """
+        Whether the item is a coffee delivered every other week
+        """
+        return self._is_fortnightly
+
+    @property
+    def is_subscription(self):
+        return self._is_subscription
+
 class _BaseFriendlyItem(_BaseItem):
     """
     Base lineitem class that has a seperate customer friendly 
@@ -110,6 +196,7 @@ class Lineitems(object):
         The standard butter and crust subscription
         """
         
+        SKU = 1
         DESCRIPTION = "Butter & Crust Subscription (Loaf Included)"
         IMG = posixpath.join(IMG_DIR, "Subscription_logo.png")
 
@@ -121,6 +208,7 @@ class Lineitems(object):
         An addition loaf of sourdough
         """
 
+        SKU = 2
         DESCRIPTION = "Extra Loaf"
         IMG = posixpath.join(IMG_DIR, "ExtraLoaf_logo.png")
 
@@ -132,6 +220,7 @@ class Lineitems(object):
         Pastries and cakes
         """
 
+        SKU = 3
         DESCRIPTION = "Sweet Morning Treats"
         IMG = posixpath.join(IMG_DIR, "Pastries_logo.png")
 
@@ -143,6 +232,7 @@ class Lineitems(object):
         Bottle of apple juice
         """
 
+        SKU = 4
         DESCRIPTION = "Townsend Farm Apple Juice 750ml"
         IMG = posixpath.join(IMG_DIR, "AppleJuice_logo.png")
 
@@ -154,6 +244,7 @@ class Lineitems(object):
         Granola
         """
 
+        SKU = 5
         DESCRIPTION = "Granola"
         IMG = posixpath.join(IMG_DIR, "Granola_logo.png")
 
@@ -165,6 +256,7 @@ class Lineitems(object):
         Cultered butter
         """
 
+        SKU = 6
         DESCRIPTION = "Cultured Butter 250g"
         IMG = posixpath.join(IMG_DIR, "CulturedButter_logo.png")
 
@@ -176,6 +268,7 @@ class Lineitems(object):
         Preserves
         """
 
+        SKU = 7
         DESCRIPTION = "Preserves 125g"
         IMG = posixpath.join(IMG_DIR, "Preserves_logo.png")
 
@@ -187,6 +280,7 @@ class Lineitems(object):
         Classic wholebean coffee delivered weekly
         """
 
+        SKU = 8
         DESCRIPTION = "Monmouth Coffee. - Classic / Wholebean / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -199,6 +293,7 @@ class Lineitems(object):
         Classic wholebean coffee delivered every other week
         """
 
+        SKU = 9
         DESCRIPTION = "Monmouth Coffee. - Classic / Wholebean / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -211,6 +306,7 @@ class Lineitems(object):
         Espresso wholebean coffee delivered weekly
         """
 
+        SKU = 10
         DESCRIPTION = "Monmouth Coffee. - Espresso / Wholebean / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -223,6 +319,7 @@ class Lineitems(object):
         Espresso wholebean coffee delivered weekly
         """
 
+        SKU = 11
         DESCRIPTION = "Monmouth Coffee. - Espresso / Wholebean / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -235,6 +332,7 @@ class Lineitems(object):
         Our pick of wholebean coffee delivered weekly
         """
 
+        SKU = 12
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Wholebean / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -247,6 +345,7 @@ class Lineitems(object):
         Our pick of wholebean coffee delivered every other week
         """
         
+        SKU = 13
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Wholebean / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Wholebean / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -259,6 +358,7 @@ class Lineitems(object):
         Classic Coarse coffee delivered weekly
         """
         
+        SKU = 14
         DESCRIPTION = "Monmouth Coffee. - Classic / Coarse / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -271,6 +371,7 @@ class Lineitems(object):
         Classic Coarse coffee delivered every other week
         """
         
+        SKU = 15
         DESCRIPTION = "Monmouth Coffee. - Classic / Coarse / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -283,6 +384,7 @@ class Lineitems(object):
         Espresso Coarse coffee delivered weekly
         """
         
+        SKU = 16
         DESCRIPTION = "Monmouth Coffee. - Espresso / Coarse / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -294,6 +396,7 @@ class Lineitems(object):
         Espresso Coarse coffee delivered weekly
         """
         
+        SKU = 17
         DESCRIPTION = "Monmouth Coffee. - Espresso / Coarse / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -306,6 +409,7 @@ class Lineitems(object):
         Our pick of Coarse coffee delivered weekly
         """
         
+        SKU = 18
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Coarse / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -318,6 +422,7 @@ class Lineitems(object):
         Our pick of Coarse coffee delivered every other week
         """
         
+        SKU = 19
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Coarse / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Coarse / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -330,6 +435,7 @@ class Lineitems(object):
         Classic Medium coffee delivered weekly
         """
         
+        SKU = 20
         DESCRIPTION = "Monmouth Coffee. - Classic / Medium / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -342,6 +448,7 @@ class Lineitems(object):
         Classic Medium coffee delivered every other week
         """
         
+        SKU = 21
         DESCRIPTION = "Monmouth Coffee. - Classic / Medium / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -354,6 +461,7 @@ class Lineitems(object):
         Espresso Medium coffee delivered weekly
         """
         
+        SKU = 22
         DESCRIPTION = "Monmouth Coffee. - Espresso / Medium / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -366,6 +474,7 @@ class Lineitems(object):
         Espresso Medium coffee delivered weekly
         """
         
+        SKU = 23
         DESCRIPTION = "Monmouth Coffee. - Espresso / Medium / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -378,6 +487,7 @@ class Lineitems(object):
         Our pick of Medium coffee delivered weekly
         """
         
+        SKU = 24
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Medium / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -390,6 +500,7 @@ class Lineitems(object):
         Our pick of Medium coffee delivered every other week
         """
         
+        SKU = 25
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Medium / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Medium / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -403,6 +514,7 @@ class Lineitems(object):
         Classic Fine coffee delivered weekly
         """
         
+        SKU = 26
         DESCRIPTION = "Monmouth Coffee. - Classic / Fine / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -415,6 +527,7 @@ class Lineitems(object):
         Classic Fine coffee delivered every other week
         """
         
+        SKU = 27
         DESCRIPTION = "Monmouth Coffee. - Classic / Fine / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Classic / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "ClassicCoffee_logo.png")
@@ -427,6 +540,7 @@ class Lineitems(object):
         Espresso Fine coffee delivered weekly
         """
         
+        SKU = 28
         DESCRIPTION = "Monmouth Coffee. - Espresso / Fine / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -439,6 +553,7 @@ class Lineitems(object):
         Espresso Fine coffee delivered weekly
         """
         
+        SKU = 29
         DESCRIPTION = "Monmouth Coffee. - Espresso / Fine / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Espresso / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "EspressoCoffee_logo.png")
@@ -451,6 +566,7 @@ class Lineitems(object):
         Our pick of Fine coffee delivered weekly
         """
         
+        SKU = 30
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Fine / 250g per week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -463,6 +579,7 @@ class Lineitems(object):
         Our pick of Fine coffee delivered every other week
         """
         
+        SKU = 31
         DESCRIPTION = "Monmouth Coffee. - Our Pick / Fine / 250g every other week"
         FRIENDLY_DESC = "Monmouth Coffee. - Our Pick / Fine / 250g"
         IMG = posixpath.join(IMG_DIR, "OurPickCoffee_logo.png")
@@ -489,25 +606,143 @@ class Lineitems(object):
                 if hasattr(item_class, "DESCRIPTION"):
                     items[item_class.DESCRIPTION] = item_class()
             cls.items = items
+            cls._catalog = {_normalise(desc): item for desc, item in items.items()}
+            cls._items_by_sku = dict()
+
+            for item in items.values():
+                if item.sku in cls._items_by_sku:
+                    raise ValueError("Duplicate SKU {} for {} and {}".format(
+                        item.sku, item, cls._items_by_sku[item.sku]))
+                cls._items_by_sku[item.sku] = item
         return cls.items
 
+    @classmethod
+    def by_sku(cls, sku):
+        """
+        Returns the catalog Lineitem class instance with an integer SKU
+        """
+        return cls._items_by_sku[sku]
+
+    @classmethod
+    def num_skus(cls):
+        """
+        Length of an array indexed by every catalog SKU
+        """
+        return max(cls._items_by_sku) + 1
+
+    @classmethod
+    def stock_to_dict(cls, stock, skus=None):
+        """
+        Maps an array of quantities indexed by SKU back to descriptions
+
+        Args:
+            stock(``array``): quantity of each SKU
+            skus(``SkuMap``, optional): SKUs of the run that counted
+                stock, default is the catalog SKUs only
+
+        Returns:
+            (``dict``): description to quantity of every SKU with a
+                non zero quantity, in the order the run first counted
+                them, or in SKU order without skus
+        """
+        if skus is None:
+            return {
+                cls.by_sku(sku).description: int(qty)
+                for sku, qty in enumerate(stock) if qty
+            }
+
+        return {
+            skus.by_sku(sku).description: int(stock[sku])
+            for sku in skus.counted() if stock[sku]
+        }
+
     @classmethod
     def get(cls, description):
         """
-        Returns a Lineitem class instance, by its description.
+        Returns a Lineitem class instance, by its description. 
+        Descriptions are matched ignoring case and whitespace.
 
         If the description is unmatched, will create a generic
-        item instance.
+        item instance. The same instance is returned for repeats of an 
+        unmatched description.
         """
 
-        item_classes = cls._discover_items()
-        try:
-            item = item_classes[description]
-        except KeyError:
-            # if unmatched
-            if "coffee" in description.lower():
-                item = _DefaultCoffeeItem(description)
-            else:
-                item = _BaseItem(description)
+        item = cls._catalog.get(_normalise(description))
+
+        if item is None:
+            item = _fallback_item(description)
         
         return item
+
+@functools.lru_cache(maxsize=FALLBACK_CACHE_SIZE)
+def _fallback_item(description):
+    """
+    Generic item for an unmatched description
+    """
+    if "coffee" in description.lower():
+        item = _DefaultCoffeeItem(description)
+    else:
+        item = _BaseItem(description)
+
+    return item
+
+class SkuMap():
+    """
+    SKUs of the items counted in a single run. Catalog items keep their
+    own SKU and each unmatched description is given the next SKU after
+    the catalog the first time the run sees it, so arrays indexed by SKU
+    only grow with the items of the run.
+    """
+
+    def __init__(self):
+        self._items_by_sku = dict(Lineitems._items_by_sku)
+        self._fallback_skus = dict()
+        self._fallback_start = Lineitems.num_skus()
+
+        # SKUs in the order the run first counted them
+        self._counted = dict()
+
+    def sku(self, item):
+        """
+        Gets the SKU of an item, giving unmatched items a SKU for the
+        rest of the run
+        """
+        if item.sku is not None:
+            return item.sku
+
+        sku = self._fallback_skus.get(item.description)
+
+        if sku is None:
+            sku = self._fallback_start + len(self._fallback_skus)
+            self._fallback_skus[item.description] = sku
+            self._items_by_sku[sku] = item
+
+        return sku
+
+    def count(self, skus):
+        """
+        Records SKUs counted by the run, keeping the order each was
+        first counted in
+        """
+        self._counted.update(dict.fromkeys(int(sku) for sku in skus))
+
+    def counted(self):
+        """
+        Returns the SKUs counted by the run, in the order first counted
+        """
+        return list(self._counted)
+
+    def by_sku(self, sku):
+        """
+        Returns the Lineitem class instance with an integer SKU
+        """
+        return self._items_by_sku[sku]
+
+    def __len__(self):
+        """
+        Length of an array indexed by every SKU of the run so far
+        """
+        return self._fallback_start + len(self._fallback_skus)
+
+# build the catalog index once at import
+Lineitems._discover_items()
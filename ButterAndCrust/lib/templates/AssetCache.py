@@ -0,0 +1,82 @@
+import base64
+import mimetypes
+import os
+import pathlib
+import posixpath
+import re
+
+from ButterAndCrust.lib.PackageConfig import IMG_DIR
+
+class AssetCache():
+    """
+    Resolves the images used by packing slips to local files, so
+    wkhtmltopdf never has to fetch them over the network.
+
+    Remote urls of assets that ship with the package are swapped for
+    the local copy in IMG_DIR. Local images are referenced by file url
+    or, when embed is True, inlined as base64 data uris. Each image is
+    resolved once and cached for the rest of the run.
+
+    :param image_dir:           (str, optional) directory of local images
+    :param embed:               (bool, optional) inline images as data
+                                uris rather than file urls
+    """
+
+    # remote assets used by templates and the local copy of each
+    REMOTE_ASSETS = {
+        "https://cdn.shopify.com/s/files/1/0463/6098/5764/files/1080_B_C_short_845ea474-14bb-4794-bfd7-c75c5beb7d8f.png?v=1600620183": "BnC_logo.png",
+    }
+
+    SRC_PATTERN = re.compile(r'(src=")([^"]*)(")')
+
+    def __init__(self, image_dir=IMG_DIR, embed=False):
+        self.image_dir = image_dir
+        self.embed = embed
+        self._cache = dict()
+
+    def resolve(self, ref):
+        """
+        Resolves an image reference to a local file url or data uri.
+        Remote urls that aren't shipped with the package are returned
+        unchanged.
+
+        Args:
+            ref(``str``): url or file path of an image
+
+        Returns:
+            (``str``): reference to use in the html
+        """
+        if not ref:
+            return ""
+
+        if ref not in self._cache:
+            self._cache[ref] = self._resolve(ref)
+
+        return self._cache[ref]
+
+    def _resolve(self, ref):
+        if ref in self.REMOTE_ASSETS:
+            path = posixpath.join(self.image_dir, self.REMOTE_ASSETS[ref])
+        elif re.match(r"^[a-z][a-z0-9+.-]*://", ref, re.IGNORECASE) or ref.startswith("data:"):
+            return ref
+        else:
+            path = ref
+
+        if not os.path.exists(path):
+            return ref
+
+        if not self.embed:
+            return pathlib.Path(os.path.abspath(path)).as_uri()
+
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with open(path, "rb") as image:
+            data = base64.b64encode(image.read()).decode("ascii")
+
+        return "data:{};base64,{}".format(mime_type, data)
+
+    def resolve_html(self, html):
+        """
+        Resolves the src of every image in a html string
+        """
+        return self.SRC_PATTERN.sub(
+            lambda m: m.group(1) + self.resolve(m.group(2)) + m.group(3), html)
@@ -0,0 +1,83 @@
+import re
+from string import Formatter
+
+class CompiledTemplate():
+    """
+    A str.format style html template that is parsed once into static
+    and dynamic segments so each render is a single join.
+
+    Any <style> blocks are taken out of the template and kept in style,
+    so they can be written once per document rather than once per
+    packing slip.
+
+    >>> template = CompiledTemplate("<p>{name}</p><style>p {{ color: red; }}</style>")
+    >>> template.render(name="Butter & Crust")
+    '<p>Butter & Crust</p>'
+    >>> template.style
+    '<style>p { color: red; }</style>'
+
+    :param template:            (str) formattable string of html template
+    """
+
+    STYLE_PATTERN = re.compile(r"<style.*?</style>", re.DOTALL | re.IGNORECASE)
+
+    def __init__(self, template):
+        self.source = template
+
+        style = self.STYLE_PATTERN.findall(template)
+        body = self.STYLE_PATTERN.sub("", template)
+
+        self.style = "".join(style).format()
+        self._segments, self._fields = self._compile(body)
+
+    @staticmethod
+    def _compile(template):
+        """
+        Splits a template into a list of segments where the literal
+        segments are ready to join and the dynamic ones are placeholders
+        filled in on render.
+
+        Returns:
+            (segments(``list``), fields(``list``)): fields holds the
+                (segment index, field name, conversion, format spec)
+                of every dynamic segment
+        """
+        segments = []
+        fields = []
+
+        for literal, name, format_spec, conversion in Formatter().parse(template):
+            if literal:
+                segments.append(literal)
+
+            if name is not None:
+                fields.append((len(segments), name, conversion, format_spec))
+                segments.append(None)
+
+        return segments, fields
+
+    def render(self, **context):
+        """
+        Renders the template body, without its style, with the same
+        result as str.format
+
+        Args:
+            context: values of the template fields
+
+        Returns:
+            (``str``): rendered html
+        """
+        segments = list(self._segments)
+
+        for i, name, conversion, format_spec in self._fields:
+            value = context[name]
+
+            if conversion == "r":
+                value = repr(value)
+            elif conversion == "s":
+                value = str(value)
+            elif conversion == "a":
+                value = ascii(value)
+
+            segments[i] = format(value, format_spec) if format_spec else str(value)
+
+        return "".join(segments)
@@ -0,0 +1,135 @@
+import datetime as dt
+import random
+import time
+
+import pandas as pd
+
+from ButterAndCrust.lib.OrderProcessor import OrderProcessor
+from ButterAndCrust.lib.OrderCompressor import OrderCompressor
+from ButterAndCrust.lib.Order import Order
+from ButterAndCrust.lib.Address import Address
+from ButterAndCrust.lib.items.OrderItems import Lineitems
+
+DELIVERY_DATE = dt.datetime(2021, 1, 23)
+
+ITEMS = [
+    "Butter & Crust Subscription (Loaf Included)",
+    "Extra Loaf",
+    "Sweet Morning Treats",
+    "Granola",
+    "Cultured Butter 250g",
+    "Preserves 125g",
+    "Monmouth Coffee. - Classic / Wholebean / 250g per week",
+    "Monmouth Coffee. - Our Pick / Wholebean / 250g every other week",
+    "Monmouth Coffee. - Espresso / Fine (Espresso/Moka Pot) / 250g every other week",
+]
+
+def generate_orders(num_rows, rows_per_order=4, seed=0):
+    """
+    Generates a synthetic Shopify export with num_rows lineitem rows.
+    Only the first row of each order carries the totals and addresses
+    like a real export.
+    """
+    rng = random.Random(seed)
+    rows = []
+    for i in range(num_rows):
+        order_num = i // rows_per_order
+        first = i % rows_per_order == 0
+        row = {
+            'Name': "#" + str(1000 + order_num),
+            'Email': "customer{}@example.com".format(order_num % 5000),
+            'Total': "{:.2f}".format(rng.uniform(10, 60)) if first else "",
+            'Notes': "Leave by the door" if first and order_num % 3 == 0 else "",
+            'Lineitem quantity': str(rng.randint(1, 3)),
+            'Lineitem price': "4.50",
+            'Lineitem name': rng.choice(ITEMS),
+        }
+        for prefix in ("Billing", "Shipping"):
+            row[prefix + ' Name'] = "Customer {}".format(order_num) if first else ""
+            row[prefix + ' Street'] = "1 High Street" if first else ""
+            row[prefix + ' Address1'] = "1 High Street" if first else ""
+            row[prefix + ' Address2'] = ""
+            row[prefix + ' Company'] = ""
+            row[prefix + ' City'] = "London" if first else ""
+            row[prefix + ' Zip'] = "e1 6an" if first else ""
+            row[prefix + ' Province'] = ""
+            row[prefix + ' Country'] = "GB" if first else ""
+            row[prefix + ' Phone'] = ""
+        rows.append(row)
+
+    return pd.DataFrame(rows, dtype=str)
+
+def legacy_compress(input_orders, had_fortnightly_coffee, is_fortnightly_coffee):
+    """
+    Reference implementation of the original iterrows based loop, kept
+    for comparison only
+    """
+    orders = dict()
+    total_items = dict()
+
+    for _, row in input_orders.iterrows():
+        orderID = int(row['Name'][1:])
+        if orderID not in orders:
+            orders[orderID] = Order(orderID, row['Email'])
+        if row['Total'] and not row['Total'].isspace():
+            orders[orderID].update_total(float(row['Total']))
+        if row['Notes'] and not row['Notes'].isspace():
+            orders[orderID].notes = row['Notes']
+        qty = int(row['Lineitem quantity']) if row['Lineitem quantity'] else 0
+        item = Lineitems.get(row['Lineitem name'])
+        if not (is_fortnightly_coffee(item.description)
+                and had_fortnightly_coffee.get(orders[orderID].email, False)):
+            orders[orderID].add_lineitem(item, 0.0, qty)
+        orders[orderID].add_billing_info(Address(*[row[c] for c in OrderCompressor.BILLING_COLUMNS]))
+        orders[orderID].add_shipping_info(Address(*[row[c] for c in OrderCompressor.SHIPPING_COLUMNS]))
+
+    compressed_rows = []
+    for orderID, order in orders.items():
+        lineitems = ""
+        for item in order.lineitems:
+            qty = order.lineitems[item]['quantity']
+            total_items[item] = total_items.get(item, 0) + qty
+            lineitems += (item + "|") * qty
+        compressed_rows.append({
+            "ID": orderID,
+            "Email": order.email,
+            "DeliveryDate": DELIVERY_DATE.strftime("%Y-%m-%d"),
+            "Lineitems": lineitems[:-1],
+            "BillingAddress": str(order.billing_info),
+            "ShippingAddress": str(order.shipping_info),
+            "Total": order.total,
+            "DeliveryNotes": order.notes
+        })
+
+    return total_items, compressed_rows
+
+def main():
+    is_fortnightly_coffee = OrderProcessor._is_fortnightly_coffee
+    had_fortnightly_coffee = {
+        "customer{}@example.com".format(i): i % 2 == 0 for i in range(5000)
+    }
+    compressor = OrderCompressor(DELIVERY_DATE, is_fortnightly_coffee)
+
+    print("{:>10} {:>12} {:>12} {:>10}".format("rows", "columnar(s)", "legacy(s)", "speedup"))
+    for num_rows in (1000, 10000, 100000, 1000000):
+        input_orders = generate_orders(num_rows)
+
+        start = time.perf_counter()
+        result = compressor.compress(input_orders, had_fortnightly_coffee)
+        columnar = time.perf_counter() - start
+
+        # the legacy loop is far too slow to run on the largest inputs
+        if num_rows <= 100000:
+            start = time.perf_counter()
+            expected = legacy_compress(input_orders, had_fortnightly_coffee,
+                                       is_fortnightly_coffee)
+            legacy = time.perf_counter() - start
+            assert (Lineitems.stock_to_dict(result[0], compressor.skus), result[1]) == expected
+            print("{:>10} {:>12.3f} {:>12.3f} {:>9.1f}x".format(
+                num_rows, columnar, legacy, legacy / columnar))
+        else:
+            print("{:>10} {:>12.3f} {:>12} {:>10}".format(num_rows, columnar, "-", "-"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+import datetime as dt
+import random
+import time
+
+from ButterAndCrust.lib.PackingSlipManager import PackingSlipManager
+from ButterAndCrust.lib.Order import Order
+from ButterAndCrust.lib.items.OrderItems import Lineitems
+from ButterAndCrust.lib.templates.main.StandardHTMLTemplate import template as html_template
+
+ITEMS = [
+    "Butter & Crust Subscription (Loaf Included)",
+    "Extra Loaf",
+    "Sweet Morning Treats",
+    "Granola",
+    "Cultured Butter 250g",
+    "Preserves 125g",
+    "Monmouth Coffee. - Classic / Wholebean / 250g per week",
+]
+
+LEGACY_ITEM_CONTEXT = '''
+        <div class="flex-line-item">
+        <div class="flex-line-item-description">
+        <p>
+        <span class="line-item-description-line">
+        {lineitem}
+        </span>
+        </p>
+        </div>
+        <div class="flex-line-item-quantity">
+        <p class="text-align-right">
+        {lineitem_qty}
+        </p>
+        </div>
+        </div>
+        '''
+
+def generate_orders(num_orders, seed=0):
+    """
+    Generates num_orders synthetic orders with a route and a few items
+    """
+    rng = random.Random(seed)
+    orders = []
+    for i in range(num_orders):
+        order = Order(1000 + i, "customer{}@example.com".format(i))
+        order.shipping_info = "Customer {},<br>1 High Street,<br>London,<br>E1 6AN".format(i)
+        order.billing_info = order.shipping_info
+        order.delivery_date = dt.datetime(2021, 1, 23)
+        order.route_name = "Route {}".format(i % 10)
+        order.stop_on_route = "{:02d}".format(i // 10 + 1)
+        for desc in rng.sample(ITEMS, 4):
+            order.add_lineitem(Lineitems.get(desc), 0.0, rng.randint(1, 3))
+        orders.append(order)
+    return orders
+
+def legacy_build(order):
+    """
+    Reference implementation of the original str.format based packing
+    slip, kept for comparison only
+    """
+    item_str = ""
+    for desc in order.lineitems:
+        if "subscription" not in desc.lower():
+            item = order.lineitems[desc]['item']
+            qty = order.lineitems[desc]['quantity']
+            item_desc = item.friendly_desc if qty == 1 else "<strong><u>" + item.friendly_desc + "</u></strong>"
+            qty_str = str(qty) if qty == 1 else "<strong><u>" + str(qty) + "</u></strong>"
+            item_str += LEGACY_ITEM_CONTEXT.format(lineitem=item_desc, lineitem_qty=qty_str)
+
+    return html_template.format(
+        orderID=order.ID,
+        delivery_date=order.delivery_date.date(),
+        shipping_address=order.shipping_info,
+        billing_address=order.billing_info,
+        lineitems=item_str,
+        ordernotes=order.notes,
+        shop_name="Butter & Crust",
+        shop_email="support@butterandcrust.com",
+        shop_domain="butterandcrust.com",
+        bikename=order.bike_name,
+        stopnumber=order.stop_on_route,
+        routename=order.route_name
+    )
+
+def main():
+    manager = PackingSlipManager("", html_template, "")
+
+    print("{:>8} {:>16} {:>16} {:>14} {:>14}".format(
+        "slips", "legacy us/slip", "compiled us/slip", "legacy bytes", "compiled bytes"))
+    for num_orders in (100, 1000, 10000):
+        orders = generate_orders(num_orders)
+
+        start = time.perf_counter()
+        legacy_slips = [legacy_build(order) for order in orders]
+        legacy = time.perf_counter() - start
+
+        start = time.perf_counter()
+        slips = [manager.build_order_packing_slip(order, manager.html_template) for order in orders]
+        compiled = time.perf_counter() - start
+
+        # html sent to wkhtmltopdf for one document of every slip
+        legacy_html = manager.PAGE_BREAK.join(legacy_slips)
+        compiled_html = manager.html_template.style + manager.PAGE_BREAK.join(slips)
+
+        print("{:>8} {:>16.1f} {:>16.1f} {:>14,} {:>14,}".format(
+            num_orders, 1e6 * legacy / num_orders, 1e6 * compiled / num_orders,
+            len(legacy_html.encode()), len(compiled_html.encode())))
+
+
+if __name__ == "__main__":
+    main()
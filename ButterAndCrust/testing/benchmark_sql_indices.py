@@ -0,0 +1,73 @@
+import datetime as dt
+import os
+import random
+import tempfile
+import time
+
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import sqlCompressedOrderHistory
+from ButterAndCrust.testing.benchmark_sql_insert import generate_rows
+
+ORDERS_PER_WEEK = 1000
+NUM_QUERIES = 20
+
+def generate_history(years, seed=0):
+    """
+    Generates years of weekly delivery CompressedOrderHistory records
+    """
+    rng = random.Random(seed)
+    weeks = 52 * years
+    rows = generate_rows(weeks * ORDERS_PER_WEEK)
+    first = dt.date(2021, 1, 2)
+    for row in rows:
+        row["DeliveryDate"] = str(first + dt.timedelta(weeks=row["ID"] // ORDERS_PER_WEEK))
+        row["Email"] = "customer{}@example.com".format(rng.randrange(5 * ORDERS_PER_WEEK))
+    return rows, [first + dt.timedelta(weeks=w) for w in range(4, weeks)]
+
+def time_queries(table, dates):
+    """
+    Times both hot queries over the given delivery dates and returns
+    the ms per query of each
+    """
+    start = time.perf_counter()
+    for date in dates:
+        table.get_all_by_delivery_date(date, date + dt.timedelta(days=1))
+    by_date = (time.perf_counter() - start) / len(dates)
+
+    start = time.perf_counter()
+    for date in dates:
+        table.get_most_recent_order_by_email(date)
+    recent = (time.perf_counter() - start) / len(dates)
+
+    return 1000 * by_date, 1000 * recent
+
+def main():
+    print("{:>6} {:>9} {:>16} {:>16} {:>16} {:>16}".format(
+        "years", "rows", "date scan ms", "date index ms", "recent scan ms", "recent index ms"))
+
+    rng = random.Random(0)
+    for years in (1, 2, 5, 10):
+        rows, dates = generate_history(years)
+        dates = rng.sample(dates, NUM_QUERIES)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            table = sqlCompressedOrderHistory(os.path.join(tmp_dir, "bench.db"))
+            table.create_table()
+            table.insert_many(rows)
+            table.index_manager.analyze()
+
+            indexed = time_queries(table, dates)
+
+            # the indices the table had before the covering index
+            table._execute("DROP INDEX cover_DeliveryDay")
+            table.index_manager.analyze()
+
+            scanned = time_queries(table, dates)
+
+            table.connections.close_all()
+
+        print("{:>6} {:>9,} {:>16.1f} {:>16.1f} {:>16.1f} {:>16.1f}".format(
+            years, len(rows), scanned[0], indexed[0], scanned[1], indexed[1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import os
+import sys
+import tempfile
+import time
+
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import sqlCompressedOrderHistory
+
+def generate_rows(num_rows):
+    """
+    Generates num_rows synthetic CompressedOrderHistory records
+    """
+    return [{
+        "ID": i,
+        "Email": "customer{}@example.com".format(i % 5000),
+        "DeliveryDate": "2021-01-23",
+        "Lineitems": "Butter & Crust Subscription (Loaf Included)|Extra Loaf",
+        "BillingAddress": "Customer,<br>1 High Street,<br>London,<br>E1 6AN",
+        "ShippingAddress": "Customer,<br>1 High Street,<br>London,<br>E1 6AN",
+        "Total": 25.0,
+        "DeliveryNotes": "N/A"
+    } for i in range(num_rows)]
+
+def time_insert(num_rows, legacy):
+    """
+    Times inserting num_rows into a fresh on disk table and returns
+    the rows per second
+    """
+    rows = generate_rows(num_rows)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table = sqlCompressedOrderHistory(os.path.join(tmp_dir, "bench.db"))
+        table._execute(table.generate_create_table_string())
+
+        start = time.perf_counter()
+        if legacy:
+            # the original path, one insert and commit per row
+            for row in rows:
+                table.insert(row)
+        else:
+            table.insert_many(rows)
+        elapsed = time.perf_counter() - start
+
+        table.connections.close_all()
+
+    return num_rows / elapsed
+
+def main():
+    """
+    Usage: python benchmark_sql_insert.py [max legacy rows]
+
+    The per row path commits once per row so it can take a very long
+    time on the larger sizes, pass a row limit to skip it above that.
+    """
+    max_legacy_rows = int(sys.argv[1]) if len(sys.argv) > 1 else None
+
+    print("{:>10} {:>16} {:>16} {:>10}".format("rows", "batched rows/s", "per row rows/s", "speedup"))
+    for num_rows in (10000, 100000, 1000000):
+        batched = time_insert(num_rows, legacy=False)
+
+        if max_legacy_rows is None or num_rows <= max_legacy_rows:
+            legacy = time_insert(num_rows, legacy=True)
+            print("{:>10} {:>16,.0f} {:>16,.0f} {:>9.1f}x".format(
+                num_rows, batched, legacy, batched / legacy))
+        else:
+            print("{:>10} {:>16,.0f} {:>16} {:>10}".format(num_rows, batched, "-", "-"))
+
+
+if __name__ == "__main__":
+    main()
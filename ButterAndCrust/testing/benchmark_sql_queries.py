@@ -0,0 +1,71 @@
+import datetime as dt
+import os
+import random
+import tempfile
+import time
+
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import sqlCompressedOrderHistory
+from ButterAndCrust.testing.benchmark_sql_insert import generate_rows
+
+NUM_ROWS = 100000
+NUM_QUERIES = 5000
+
+def legacy_lookup(table, ID):
+    """
+    The original path, with the value formatted into the sql text so
+    every lookup is a new statement that has to be compiled
+    """
+    sql = "SELECT * FROM {} WHERE ID = {}".format(table.name, ID)
+    return table.conn.execute(sql).fetchall()
+
+def bound_lookup(table, ID):
+    """
+    The same lookup with the value bound as a parameter
+    """
+    sql = "SELECT * FROM {} WHERE ID = ?".format(table.name)
+    return table.conn.execute(sql, (ID,)).fetchall()
+
+def legacy_max(table, email):
+    sql = "SELECT MAX(DeliveryDate) FROM {} WHERE Email = '{}'".format(table.name, email)
+    return table.conn.execute(sql).fetchone()[0]
+
+def bound_max(table, email):
+    return table.max("DeliveryDate", where="Email = ?", params=(email,))
+
+def time_queries(fn, table, args):
+    """
+    Runs fn over args and returns the queries per second
+    """
+    start = time.perf_counter()
+    for arg in args:
+        fn(table, arg)
+    return len(args) / (time.perf_counter() - start)
+
+def main():
+    rng = random.Random(0)
+    rows = generate_rows(NUM_ROWS)
+    for row in rows:
+        row["DeliveryDate"] = str(dt.date(2021, 1, 2) + dt.timedelta(days=row["ID"] % 365))
+
+    IDs = [rng.randrange(NUM_ROWS) for _ in range(NUM_QUERIES)]
+    emails = ["customer{}@example.com".format(rng.randrange(5000)) for _ in range(NUM_QUERIES)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        table = sqlCompressedOrderHistory(os.path.join(tmp_dir, "bench.db"))
+        table.create_table()
+        table.insert_many(rows)
+
+        print("{:>16} {:>14} {:>14} {:>10}".format("query", "legacy q/s", "bound q/s", "speedup"))
+        for name, legacy, bound, args in (
+                ("lookup by ID", legacy_lookup, bound_lookup, IDs),
+                ("max by email", legacy_max, bound_max, emails)):
+            legacy_qps = time_queries(legacy, table, args)
+            bound_qps = time_queries(bound, table, args)
+            print("{:>16} {:>14,.0f} {:>14,.0f} {:>9.1f}x".format(
+                name, legacy_qps, bound_qps, bound_qps / legacy_qps))
+
+        table.connections.close_all()
+
+
+if __name__ == "__main__":
+    main()
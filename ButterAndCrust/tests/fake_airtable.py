@@ -0,0 +1,280 @@
+import datetime as dt
+import itertools
+import json
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote, parse_qs
+
+import requests
+
+class FakeAirtable(object):
+    """
+    In memory fake of the parts of the Airtable REST API used by the
+    package. Supports listing with formulas, sorting, projection and
+    pagination as well as batch create, update and delete.
+
+    Attributes:
+        tables(``dict``): table name to list of records
+        requests(``list``): (method, table) of every request handled
+        failures(``list``): statuses to respond with, in order, before
+            handling requests normally
+    """
+
+    PAGE_SIZE = 100
+
+    def __init__(self):
+        self.tables = dict()
+        self.requests = []
+        self.failures = []
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def add_records(self, table, fields_list):
+        """
+        Adds records straight into a table, returning the new records
+        """
+        records = self.tables.setdefault(table, [])
+        new_records = []
+        for fields in fields_list:
+            now = dt.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+            record = {
+                'id': "rec{:014d}".format(next(self._ids)),
+                'fields': self._normalise(fields),
+                'createdTime': now,
+                '_modified': now
+            }
+            records.append(record)
+            new_records.append(record)
+        return new_records
+
+    @staticmethod
+    def _normalise(fields):
+        """
+        Stores dates the way Airtable returns datetime fields
+        """
+        fields = dict(fields)
+        date = fields.get('DeliveryDate')
+        if isinstance(date, str) and len(date) == 10:
+            fields['DeliveryDate'] = date + "T00:00:00.000Z"
+        return fields
+
+    @staticmethod
+    def _public(record, fields=None):
+        """
+        Strips private keys and applies field projection to a record
+        """
+        record_fields = record['fields']
+        if fields:
+            record_fields = {k: v for k, v in record_fields.items() if k in fields}
+        return {'id': record['id'], 'fields': record_fields,
+                'createdTime': record['createdTime']}
+
+    def handle(self, method, url, params, body):
+        """
+        Handles a single API request.
+
+        Args:
+            method(``str``): http method
+            url(``str``): full request url
+            params(``dict``): query parameter name to list of values
+            body(``dict``): decoded json body
+
+        Returns:
+            (status(``int``), body(``dict``))
+        """
+        with self._lock:
+            return self._handle(method, url, params, body)
+
+    def _handle(self, method, url, params, body):
+        path = [unquote(p) for p in urlparse(url).path.split("/") if p]
+        table = path[2]
+        method = method.upper()
+        self.requests.append((method, table))
+        records = self.tables.setdefault(table, [])
+
+        if self.failures:
+            return self.failures.pop(0), {'error': 'INJECTED_FAILURE'}
+
+        if method == "GET":
+            return 200, self._list(records, params)
+
+        if method == "POST":
+            created = self.add_records(table, [r['fields'] for r in body['records']])
+            return 200, {'records': [self._public(r) for r in created]}
+
+        if method == "PATCH":
+            by_id = {r['id']: r for r in records}
+            updated = []
+            for new in body['records']:
+                record = by_id[new['id']]
+                record['fields'].update(self._normalise(new['fields']))
+                record['_modified'] = dt.datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.000Z")
+                updated.append(self._public(record))
+            return 200, {'records': updated}
+
+        if method == "DELETE":
+            to_delete = set(params.get('records[]', []) + params.get('records', []) + path[3:])
+            self.tables[table] = [r for r in records if r['id'] not in to_delete]
+            return 200, {'records': [{'id': i, 'deleted': True} for i in to_delete]}
+
+        return 405, {'error': 'METHOD_NOT_ALLOWED'}
+
+    def _list(self, records, params):
+        """
+        Lists records applying the filterByFormula, sort, maxRecords,
+        fields and offset parameters
+        """
+        formula = params.get('filterByFormula', [None])[0]
+        if formula:
+            records = [r for r in records if _evaluate(formula, r)]
+
+        sort_field = params.get('sort[0][field]', [None])[0]
+        if sort_field:
+            reverse = params.get('sort[0][direction]', ['asc'])[0] == 'desc'
+            records = sorted(
+                (r for r in records if r['fields'].get(sort_field) is not None),
+                key=lambda r: r['fields'][sort_field],
+                reverse=reverse
+            )
+
+        max_records = params.get('maxRecords', [None])[0]
+        if max_records:
+            records = records[:int(max_records)]
+
+        page_size = int(params.get('pageSize', [self.PAGE_SIZE])[0])
+        offset = int(params.get('offset', [0])[0] or 0)
+        page = records[offset:offset + page_size]
+
+        response = {'records': [self._public(r, params.get('fields[]')) for r in page]}
+        if offset + page_size < len(records):
+            response['offset'] = str(offset + page_size)
+        return response
+
+
+class FakeResponse(object):
+    """
+    Minimal stand in for a requests Response
+    """
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self._body = body
+
+    def json(self):
+        return self._body
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(
+                "{} Error".format(self.status_code), response=self)
+
+
+class FakeSession(object):
+    """
+    requests Session replacement that routes requests to a FakeAirtable
+    """
+    def __init__(self, fake):
+        self.fake = fake
+
+    def request(self, method, url, params=None, json=None, timeout=None):
+        query = dict()
+        for key, value in (params or {}).items():
+            if value is None:
+                continue
+            query[key] = [str(v) for v in value] if isinstance(value, list) else [str(value)]
+        return FakeResponse(*self.fake.handle(method, url, query, json))
+
+
+class FakeAirtableServer(object):
+    """
+    Serves a FakeAirtable over http on localhost.
+
+    Usage:
+
+    >>> with FakeAirtableServer(FakeAirtable()) as server:
+    ...     table.url_table = server.table_url("appTEST", "Table")
+    """
+    def __init__(self, fake):
+        self.fake = fake
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def _respond(handler):
+                length = int(handler.headers.get('Content-Length') or 0)
+                body = json.loads(handler.rfile.read(length)) if length else None
+                params = parse_qs(urlparse(handler.path).query)
+                status, response = fake.handle(handler.command, handler.path, params, body)
+
+                payload = json.dumps(response).encode()
+                handler.send_response(status)
+                handler.send_header('Content-Type', 'application/json')
+                handler.send_header('Content-Length', str(len(payload)))
+                handler.end_headers()
+                handler.wfile.write(payload)
+
+            do_GET = do_POST = do_PATCH = do_DELETE = _respond
+
+            def log_message(handler, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def table_url(self, base_key, table_name):
+        host, port = self._server.server_address
+        return "http://{}:{}/v0/{}/{}".format(host, port, base_key, table_name)
+
+
+def _parse_date(value):
+    return dt.datetime.strptime(value[:10], "%Y-%m-%d")
+
+def _evaluate(formula, record):
+    """
+    Evaluates the subset of the Airtable formula language used by the
+    package against a single record
+    """
+    fields = record['fields']
+
+    def field(name):
+        value = fields.get(name)
+        if isinstance(value, str) and re.match(r"\d{4}-\d{2}-\d{2}", value):
+            return _parse_date(value)
+        return value
+
+    def datetime_parse(value, fmt):
+        return dt.datetime.strptime(value, "%Y/%m/%d")
+
+    def to_date(value):
+        return value if isinstance(value, dt.datetime) else dt.datetime.strptime(
+            value.replace("Z", ""), "%Y-%m-%dT%H:%M:%S.%f")
+
+    expr = re.sub(r"\{([^}]+)\}", lambda m: "_field({!r})".format(m.group(1)), formula)
+    expr = re.sub(r"(?<![<>!=])=(?!=)", "==", expr)
+    expr = (expr
+            .replace("NOT(", "_not(")
+            .replace("BLANK()", "None")
+            .replace("OR(", "_any(")
+            .replace("AND(", "_all(")
+            .replace("DATETIME_PARSE(", "_datetime_parse(")
+            .replace("LAST_MODIFIED_TIME()", "_to_date({!r})".format(record['_modified']))
+            .replace("IS_AFTER(", "_is_after(")
+            .replace("\n", " "))
+
+    namespace = {
+        '_field': field,
+        '_not': lambda arg: not arg,
+        '_any': lambda *args: any(args),
+        '_all': lambda *args: all(args),
+        '_datetime_parse': datetime_parse,
+        '_is_after': lambda a, b: to_date(a) > to_date(b),
+        '_to_date': to_date,
+    }
+    return eval(expr.strip(), namespace)
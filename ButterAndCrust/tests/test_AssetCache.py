@@ -0,0 +1,40 @@
+import posixpath
+
+from ButterAndCrust.lib.PackageConfig import IMG_DIR
+from ButterAndCrust.lib.templates.AssetCache import AssetCache
+from ButterAndCrust.lib.templates.main.StandardHTMLTemplate import template as html_template
+
+def test_resolve_remote_logo():
+    """
+    Tests that the template logo is swapped for the local copy
+    """
+    html = AssetCache().resolve_html(html_template)
+
+    assert "https://" not in html
+    assert posixpath.join(IMG_DIR, "BnC_logo.png").lstrip("/") in html
+    assert 'src="file://' in html
+
+def test_resolve_embedded_and_cached(tmp_path):
+    """
+    Tests that local images are inlined as data uris and only read once
+    """
+    image = tmp_path / "logo.png"
+    image.write_bytes(b"png")
+    assets = AssetCache(image_dir=str(tmp_path), embed=True)
+
+    assert assets.resolve(str(image)) == "data:image/png;base64,cG5n"
+
+    image.write_bytes(b"changed")
+    assert assets.resolve(str(image)) == "data:image/png;base64,cG5n"
+
+def test_resolve_unknown():
+    """
+    Tests that unknown remote urls, missing files and blanks are left 
+    alone
+    """
+    assets = AssetCache()
+
+    assert assets.resolve("https://example.com/logo.png") == "https://example.com/logo.png"
+    assert assets.resolve("missing.png") == "missing.png"
+    assert assets.resolve(None) == ""
+    assert assets.resolve_html('<img src="{lineitem_image}">') == '<img src="{lineitem_image}">'
@@ -0,0 +1,41 @@
+from ButterAndCrust.lib.templates.CompiledTemplate import CompiledTemplate
+from ButterAndCrust.lib.templates.main.StandardHTMLTemplate import template as html_template
+
+CONTEXT = dict(
+    orderID=1001,
+    delivery_date="2021-01-23",
+    shipping_address="1 High Street",
+    billing_address="2 High Street",
+    lineitems="<p>Extra Loaf</p>",
+    ordernotes="Ring bell",
+    shop_name="Butter & Crust",
+    shop_email="support@butterandcrust.com",
+    shop_domain="butterandcrust.com",
+    bikename="",
+    stopnumber="01",
+    routename="Route A"
+)
+
+def test_render_matches_format():
+    """
+    Tests that rendering gives the same html as str.format with the 
+    style moved out of the body
+    """
+    compiled = CompiledTemplate(html_template)
+
+    start = html_template.index("<style")
+    end = html_template.index("</style>") + len("</style>")
+    raw_style = html_template[start:end]
+
+    assert compiled.render(**CONTEXT) == html_template.replace(raw_style, "").format(**CONTEXT)
+    assert compiled.style == raw_style.format()
+    assert "{{" not in compiled.style
+
+def test_render_conversions():
+    """
+    Tests conversions and format specs are applied like str.format
+    """
+    compiled = CompiledTemplate("{a!r} {b:05.1f} {{literal}} {a}")
+
+    assert compiled.render(a="x", b=2.5) == "'x' 002.5 {literal} x"
+    assert compiled.style == ""
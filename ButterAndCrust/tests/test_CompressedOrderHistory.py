@@ -0,0 +1,353 @@
+import datetime as dt
+
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory, sqlCompressedOrderHistory, mirrorCompressedOrderHistory, tieredCompressedOrderHistory
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata, ARCHIVE_WATERMARK_KEY
+from ButterAndCrust.lib.DB.RequestScheduler import RequestScheduler
+from ButterAndCrust.tests.fake_airtable import FakeAirtable, FakeSession
+
+def make_record(ID, email="customer@test.com", date="2021-01-23", items="Extra Loaf"):
+    return {
+        "ID": ID,
+        "Email": email,
+        "DeliveryDate": date,
+        "Lineitems": items,
+        "BillingAddress": "",
+        "ShippingAddress": "",
+        "Total": 10.0,
+        "DeliveryNotes": "N/A"
+    }
+
+def make_table(tmp_path, **kwargs):
+    """
+    Creates an empty sqlCompressedOrderHistory table with its indices
+    """
+    table = sqlCompressedOrderHistory(str(tmp_path / "OrderHistory.db"), **kwargs)
+    table.create_table()
+    return table
+
+def make_airtable(fake):
+    """
+    Creates an airCompressedOrderHistory backed by a FakeAirtable
+    """
+    table = airCompressedOrderHistory("appTEST", "keyTEST")
+    table.session = FakeSession(fake)
+    table.scheduler = RequestScheduler(rate=1000, burst=1000)
+    return table
+
+def test_sync_by_ID(tmp_path):
+    """
+    Tests that syncing inserts new records and updates existing ones
+    """
+    table = make_table(tmp_path)
+    table.sync_by_ID([make_record(1), make_record(2)])
+
+    table.sync_by_ID([make_record(2, items="Granola"), make_record(3)])
+
+    df = table.select().sort_values('ID')
+    assert df['ID'].tolist() == [1, 2, 3]
+    assert df['Lineitems'].tolist() == ["Extra Loaf", "Granola", "Extra Loaf"]
+
+def test_sync_by_ID_leaves_no_temp_table(tmp_path):
+    """
+    Tests that syncing does not create any extra tables
+    """
+    table = make_table(tmp_path)
+    table.sync_by_ID([make_record(1)])
+
+    tables = table.sql_to_df("SELECT name FROM sqlite_master WHERE type='table'")
+    assert tables['name'].tolist() == ["CompressedOrderHistory"]
+
+def test_air_sync_by_ID():
+    """
+    Tests that the airtable sync looks up existing records with a single
+    fetch and splits the rest into insert and update batches
+    """
+    fake = FakeAirtable()
+    table = make_airtable(fake)
+    fake.add_records(table.name, [make_record(i) for i in range(1, 16)])
+
+    records = [make_record(i, items="Granola") for i in range(1, 31)]
+    num_requests = table.sync_by_ID(records, update=True)
+
+    # one fetch, two insert batches and two update batches of 10
+    assert num_requests == 5
+    assert len(fake.tables[table.name]) == 30
+    assert all(r['fields']['Lineitems'] == "Granola" for r in fake.tables[table.name])
+
+def test_air_get_max():
+    """
+    Tests get_max and get_min fetch a single record and are memoised
+    until the next sync
+    """
+    fake = FakeAirtable()
+    table = make_airtable(fake)
+    fake.add_records(table.name, [
+        make_record(1, date="2021-01-16"),
+        make_record(2, date="2021-01-23"),
+        make_record(3, date="2021-01-09"),
+    ])
+
+    assert table.get_max('DeliveryDate') == dt.datetime(2021, 1, 23)
+    assert table.get_min('DeliveryDate') == dt.datetime(2021, 1, 9)
+
+    num_requests = table.request_count
+    assert table.get_max('DeliveryDate') == dt.datetime(2021, 1, 23)
+    assert table.request_count == num_requests
+
+    table.sync_by_ID([make_record(4, date="2021-01-30")])
+    assert table.get_max('DeliveryDate') == dt.datetime(2021, 1, 30)
+
+def test_air_get_max_empty():
+    """
+    Tests get_max returns None for an empty table
+    """
+    table = make_airtable(FakeAirtable())
+
+    assert table.get_max('DeliveryDate') is None
+
+def test_air_get_all_by_IDs_chunks_formulas():
+    """
+    Tests long ID lists are split into formulas under the length budget
+    and the merged results are de-duplicated
+    """
+    fake = FakeAirtable()
+    table = make_airtable(fake)
+    table.MAX_FORMULA_LENGTH = 100
+    fake.add_records(table.name, [make_record(i) for i in range(200)])
+
+    IDs = list(range(150)) + list(range(50))
+    formulas = list(table._chunk_ID_formulas(IDs))
+    records = table.get_all_by_IDs(IDs)
+
+    assert len(formulas) > 1
+    assert all(len(formula) <= 100 for formula in formulas)
+    assert sorted(r['fields']['ID'] for r in records) == list(range(150))
+
+def test_get_all_by_IDs_many(tmp_path):
+    """
+    Tests the sqlite lookup binds more IDs than sqlite's variable limit
+    """
+    table = make_table(tmp_path)
+    table.insert_many([make_record(i) for i in range(2500)])
+
+    df = table.get_all_by_IDs(list(range(0, 2500, 2)) + [1, 1, 99999])
+
+    assert sorted(df['ID'].tolist()) == sorted([1] + list(range(0, 2500, 2)))
+    assert table.get_all_by_IDs([]).empty
+
+def make_mirror(fake, tmp_path):
+    """
+    Creates a mirrorCompressedOrderHistory of a FakeAirtable table
+    """
+    return mirrorCompressedOrderHistory(make_airtable(fake), str(tmp_path / "Mirror.db"))
+
+def test_create_table(tmp_path):
+    """
+    Tests that creating the table twice keeps a single set of indices
+    """
+    table = make_table(tmp_path)
+    table.create_table()
+
+    indices = table.sql_to_df("SELECT name FROM sqlite_master WHERE type='index'")
+    assert sorted(indices['name']) == ["cover_DeliveryDay", "dup_Email", "unique_ID"]
+    assert len(table.indices) == 3
+
+def test_mirror_reads_are_local(tmp_path):
+    """
+    Tests that the mirror pulls the head table once and then serves
+    reads without any API requests
+    """
+    fake = FakeAirtable()
+    fake.add_records("CompressedOrderHistory", [
+        make_record(1, "a@test.com", "2021-01-09"),
+        make_record(2, "a@test.com", "2021-01-16"),
+        make_record(3, "b@test.com", "2021-01-16")
+    ])
+    mirror = make_mirror(fake, tmp_path)
+
+    assert mirror.get_max('DeliveryDate') == dt.datetime(2021, 1, 16)
+    assert len(fake.requests) == 1
+
+    df = mirror.get_most_recent_order_by_email(dt.datetime(2021, 1, 23))
+    assert sorted(df['ID']) == [2, 3]
+    assert mirror.get_min('ID') == 1
+    assert len(fake.requests) == 1
+
+def test_mirror_delta_refresh(tmp_path):
+    """
+    Tests that a refresh only pulls records modified since the last one
+    """
+    fake = FakeAirtable()
+    fake.add_records("CompressedOrderHistory", [make_record(1), make_record(2)])
+    mirror = make_mirror(fake, tmp_path)
+    assert mirror.refresh() == 2
+
+    mirror.metadata.set(mirror.WATERMARK_KEY, "2100-01-01T00:00:00.000Z")
+    fake.add_records("CompressedOrderHistory", [make_record(3)])
+    assert mirror.refresh() == 0
+
+    mirror.metadata.set(mirror.WATERMARK_KEY, "2000-01-01T00:00:00.000Z")
+    assert mirror.refresh() == 3
+    assert sorted(mirror.mirror.select()['ID']) == [1, 2, 3]
+
+def test_mirror_refresh_drops_deleted(tmp_path):
+    """
+    Tests that orders deleted from airtable are dropped from the mirror
+    on the next refresh
+    """
+    fake = FakeAirtable()
+    fake.add_records("CompressedOrderHistory", [
+        make_record(1, "a@test.com", "2021-01-16"),
+        make_record(2, "b@test.com", "2021-01-16")
+    ])
+    mirror = make_mirror(fake, tmp_path)
+    mirror.refresh()
+
+    # order 2 is cancelled
+    fake.tables["CompressedOrderHistory"] = fake.tables["CompressedOrderHistory"][:1]
+    mirror.refresh()
+
+    df = mirror.get_all_by_delivery_date(dt.datetime(2021, 1, 16), dt.datetime(2021, 1, 17))
+    assert df['ID'].tolist() == [1]
+    df = mirror.get_most_recent_order_by_email(dt.datetime(2021, 1, 23))
+    assert df['Email'].tolist() == ["a@test.com"]
+
+def test_mirror_sync_writes_through(tmp_path):
+    """
+    Tests that syncing writes to airtable and then the local mirror
+    """
+    fake = FakeAirtable()
+    fake.add_records("CompressedOrderHistory", [make_record(1)])
+    mirror = make_mirror(fake, tmp_path)
+
+    mirror.sync_by_ID([make_record(1, items="Granola"), make_record(2)])
+
+    assert len(fake.tables["CompressedOrderHistory"]) == 2
+    df = mirror.mirror.select().sort_values('ID')
+    assert df['ID'].tolist() == [1, 2]
+    assert df['Lineitems'].tolist() == ["Extra Loaf", "Extra Loaf"]
+
+
+def make_tiered(fake, tmp_path, watermark=None):
+    """
+    Creates a tieredCompressedOrderHistory over a FakeAirtable hot table
+    and a sqlite cold table
+    """
+    cold = make_table(tmp_path)
+    if watermark:
+        sqlMetadata(cold.db_file).set(ARCHIVE_WATERMARK_KEY, watermark)
+    return tieredCompressedOrderHistory(make_airtable(fake), cold)
+
+def test_tiered_split_at_boundary(tmp_path):
+    """
+    Tests that date range queries read archived orders locally and only
+    fetch the rest from the hot table
+    """
+    fake = FakeAirtable()
+    table = make_tiered(fake, tmp_path, watermark="2021-01-16")
+    table.cold.sync_by_ID([make_record(1, "a@test.com", "2021-01-02"),
+                           make_record(2, "b@test.com", "2021-01-09")])
+    fake.add_records(table.name, [make_record(3, "a@test.com", "2021-01-16")])
+
+    df = table.get_all_by_delivery_date(dt.datetime(2021, 1, 1), dt.datetime(2021, 1, 23))
+    assert sorted(df['ID']) == [1, 2, 3]
+    assert len(fake.requests) == 1
+
+    df = table.get_all_by_delivery_date(dt.date(2021, 1, 1), dt.date(2021, 1, 10))
+    assert sorted(df['ID']) == [1, 2]
+    assert len(fake.requests) == 1
+
+    df = table.get_most_recent_order_by_email(dt.datetime(2021, 1, 23))
+    assert sorted(df['ID']) == [2, 3]
+
+def test_tiered_extrema(tmp_path):
+    """
+    Tests get_max prefers the hot table and falls back to cold storage
+    """
+    fake = FakeAirtable()
+    table = make_tiered(fake, tmp_path, watermark="2021-01-16")
+    table.cold.sync_by_ID([make_record(1, date="2021-01-02")])
+
+    assert table.get_max('DeliveryDate') == dt.datetime(2021, 1, 2)
+    assert table.get_min('DeliveryDate') == dt.datetime(2021, 1, 2)
+
+    fake.add_records(table.name, [make_record(2, date="2021-01-16")])
+    table.hot._extrema.clear()
+
+    assert table.get_max('DeliveryDate') == dt.datetime(2021, 1, 16)
+    assert table.get_max('ID') == 2
+
+def test_tiered_without_archive(tmp_path):
+    """
+    Tests that every query goes to the hot table before anything has 
+    been archived
+    """
+    fake = FakeAirtable()
+    table = make_tiered(fake, tmp_path)
+    fake.add_records(table.name, [make_record(1, date="2021-01-02")])
+
+    df = table.get_all_by_delivery_date(dt.datetime(2021, 1, 1), dt.datetime(2021, 1, 23))
+    assert df['ID'].tolist() == [1]
+
+def test_tiered_iter_by_delivery_date(tmp_path):
+    """
+    Tests that streaming a tiered table yields the archived chunks
+    first and then the hot table, with the same dtypes as the full read
+    """
+    fake = FakeAirtable()
+    table = make_tiered(fake, tmp_path, watermark="2021-01-16")
+    table.cold.sync_by_ID([make_record(i, "a@test.com", "2021-01-02") for i in range(1, 6)])
+    fake.add_records(table.name, [make_record(6, "a@test.com", "2021-01-16")])
+
+    chunks = list(table.iter_by_delivery_date(dt.datetime.min, dt.datetime.max, chunksize=2))
+
+    assert [len(df) for df in chunks] == [2, 2, 1, 1]
+    assert [ID for df in chunks for ID in df['ID']] == [1, 2, 3, 4, 5, 6]
+    assert all(df['DeliveryDate'].dtype.kind == 'M' for df in chunks)
+
+def test_tiered_without_hot(tmp_path):
+    """
+    Tests that a tiered table without a hot table only reads the
+    archived orders
+    """
+    cold = make_table(tmp_path)
+    table = tieredCompressedOrderHistory(None, cold)
+    cold.sync_by_ID([make_record(1, "a@test.com", "2021-01-02")])
+
+    assert list(table.iter_by_delivery_date(dt.datetime.min, dt.datetime.max)) == []
+
+    sqlMetadata(cold.db_file).set(ARCHIVE_WATERMARK_KEY, "2021-01-16")
+
+    chunks = list(table.iter_by_delivery_date(dt.datetime.min, dt.datetime.max))
+    assert [ID for df in chunks for ID in df['ID']] == [1]
+
+def test_epoch_day_converters():
+    """
+    Tests that delivery dates are converted to epoch days
+    """
+    assert sqlCompressedOrderHistory.to_epoch_day(dt.date(1970, 1, 1)) == 0
+    assert sqlCompressedOrderHistory.to_epoch_day("2021-01-02") == 18629
+    assert sqlCompressedOrderHistory.to_epoch_day("2021-01-02T00:00:00.000Z") == 18629
+    assert sqlCompressedOrderHistory.to_epoch_day(dt.datetime(2021, 1, 2, 12)) == 18629
+
+def test_create_table_existing_table(tmp_path):
+    """
+    Tests that a table created before its indices were declared gets
+    them added and keeps answering date range queries
+    """
+    table = sqlCompressedOrderHistory(str(tmp_path / "OrderHistory.db"))
+    table._execute(table.generate_create_table_string())
+    table._execute("CREATE UNIQUE INDEX unique_ID ON CompressedOrderHistory(ID)")
+    table.sync_by_ID([make_record(1, "a@test.com", "2021-01-02"),
+                      make_record(2, "a@test.com", "2021-01-09")])
+
+    table.create_table()
+
+    indices = table.sql_to_df("SELECT name FROM sqlite_master WHERE type='index'")
+    assert sorted(indices['name']) == ["cover_DeliveryDay", "dup_Email", "unique_ID"]
+
+    df = table.get_all_by_delivery_date(dt.datetime(2021, 1, 2), dt.date(2021, 1, 9))
+    assert df['ID'].tolist() == [1]
+
+    df = table.get_most_recent_order_by_email(dt.date(2021, 1, 10))
+    assert df['ID'].tolist() == [2]
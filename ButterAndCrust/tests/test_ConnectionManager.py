@@ -0,0 +1,69 @@
+import sqlite3
+import threading
+
+import pytest
+
+from ButterAndCrust.lib.DB.ConnectionManager import ConnectionManager
+from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable
+
+def test_shared_per_thread(tmp_path):
+    """
+    Tests that tables on the same db file share a connection per thread
+    """
+    db_file = str(tmp_path / "test.db")
+    table1 = SQLTable("Table1", ['ID'], db_file)
+    table2 = SQLTable("Table2", ['ID'], db_file)
+
+    assert table1.connections is table2.connections
+    assert table1.conn is table2.conn
+
+    other = []
+    thread = threading.Thread(target=lambda: other.append(table1.conn))
+    thread.start()
+    thread.join()
+
+    assert other[0] is not table1.conn
+
+def test_profiles(tmp_path):
+    """
+    Tests that the pragmas of each profile are applied
+    """
+    manager = ConnectionManager(str(tmp_path / "test.db"))
+
+    oltp = manager.connection('oltp')
+    assert oltp.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    assert oltp.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+    bulk_load = manager.connection('bulk_load')
+    assert bulk_load.execute("PRAGMA synchronous").fetchone()[0] == 0
+
+    archive = manager.connection('archive')
+    assert archive.execute("PRAGMA synchronous").fetchone()[0] == 2
+
+    reporting = manager.connection('reporting')
+    with pytest.raises(sqlite3.OperationalError):
+        reporting.execute("CREATE TABLE Test(ID INTEGER)")
+
+    manager.close_all()
+    assert manager.connection('oltp') is not oltp
+
+def test_read_while_writing(tmp_path):
+    """
+    Tests that a reader can query the db while a write is in progress
+    """
+    db_file = str(tmp_path / "test.db")
+    writer = SQLTable("Test", ['ID'], db_file, profile='bulk_load')
+    writer._execute("CREATE TABLE Test(ID INTEGER)")
+    writer.insert_many([{'ID': 1}])
+
+    writer.conn.execute("BEGIN")
+    writer.conn.execute("INSERT INTO Test VALUES (2)")
+
+    result = []
+    reader = SQLTable("Test", ['ID'], db_file, profile='reporting')
+    thread = threading.Thread(target=lambda: result.append(reader.select()['ID'].tolist()))
+    thread.start()
+    thread.join(timeout=5)
+
+    writer.conn.rollback()
+    assert result == [[1]]
@@ -0,0 +1,46 @@
+import datetime as dt
+
+import pandas as pd
+
+from ButterAndCrust.ConsoleScripts.DatabaseToCSV import write_csv, reaches_hot
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata, ARCHIVE_WATERMARK_KEY
+from ButterAndCrust.tests.test_CompressedOrderHistory import make_table
+
+def test_write_csv(tmp_path):
+    """
+    Tests that chunks written one at a time give the same csv as the
+    whole DataFrame
+    """
+    df = pd.DataFrame({"ID": range(5), "Email": ["{}@test.com".format(i) for i in range(5)]})
+    chunks = [df.iloc[:2].reset_index(drop=True), df.iloc[2:].reset_index(drop=True)]
+    path = str(tmp_path / "out.csv")
+
+    assert write_csv(iter(chunks), path) == 5
+
+    with open(path) as f:
+        assert f.read() == df.to_csv()
+
+def test_write_csv_empty(tmp_path):
+    """
+    Tests that an empty export still writes the header
+    """
+    path = str(tmp_path / "out.csv")
+
+    write_csv([pd.DataFrame(columns=["ID", "Email"])], path)
+
+    with open(path) as f:
+        assert f.read() == ",ID,Email\n"
+
+def test_reaches_hot(tmp_path):
+    """
+    Tests that only exports past the archive watermark read the hot table
+    """
+    cold = make_table(tmp_path)
+    assert reaches_hot(cold, dt.datetime(2021, 1, 3))
+
+    sqlMetadata(cold.db_file).set(ARCHIVE_WATERMARK_KEY, "2021-01-16")
+
+    assert not reaches_hot(cold, dt.datetime(2021, 1, 3))
+    assert not reaches_hot(cold, dt.datetime(2021, 1, 16))
+    assert reaches_hot(cold, dt.datetime(2021, 1, 17))
+    assert reaches_hot(cold, dt.datetime.max)
@@ -0,0 +1,48 @@
+import warnings
+
+import pytest
+
+from ButterAndCrust.lib.DB.IndexManager import FullScanWarning
+from ButterAndCrust.tests.test_CompressedOrderHistory import make_table
+
+def test_ensure_adds_missing_indices(tmp_path):
+    """
+    Tests that indices declared after a db was created are added to it
+    """
+    table = make_table(tmp_path)
+    table._execute("DROP INDEX cover_DeliveryDay")
+
+    table.create_table()
+
+    indices = table.sql_to_df("SELECT name FROM sqlite_master WHERE type='index'")
+    assert "cover_DeliveryDay" in indices['name'].tolist()
+
+def test_hot_queries_use_indices(tmp_path):
+    """
+    Tests that the hot queries are planned as index searches
+    """
+    table = make_table(tmp_path)
+    table.index_manager.analyze()
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", FullScanWarning)
+        plans = table.index_manager.check()
+
+    assert any("COVERING INDEX cover_DeliveryDay" in step
+               for step in plans["get_most_recent_order_by_email"])
+    assert plans["get_all_by_delivery_date"][0].startswith("SEARCH")
+
+def test_full_scan_warns(tmp_path):
+    """
+    Tests that a hot query warns once its index is dropped
+    """
+    table = make_table(tmp_path)
+    table.index_manager.check()
+    table._execute("DROP INDEX cover_DeliveryDay")
+
+    with pytest.warns(FullScanWarning) as record:
+        table.index_manager.check()
+
+    messages = [str(w.message) for w in record]
+    assert any("get_all_by_delivery_date" in m for m in messages)
+    assert any("get_most_recent_order_by_email" in m for m in messages)
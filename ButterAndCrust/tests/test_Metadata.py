@@ -0,0 +1,11 @@
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata
+
+def test_get_set(tmp_path):
+    metadata = sqlMetadata(str(tmp_path / "test.db"))
+
+    assert metadata.get("Key") is None
+    assert metadata.get("Key", "default") == "default"
+
+    metadata.set("Key", 1)
+    metadata.set("Key", 2)
+    assert metadata.get("Key") == "2"
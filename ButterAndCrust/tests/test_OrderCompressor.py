@@ -0,0 +1,112 @@
+import datetime as dt
+import pandas as pd
+
+from ButterAndCrust.lib.OrderCompressor import OrderCompressor
+from ButterAndCrust.lib.OrderProcessor import OrderProcessor
+from ButterAndCrust.lib.items.OrderItems import Lineitems
+
+FORTNIGHTLY = "Monmouth Coffee. - Classic / Wholebean / 250g every other week"
+
+def make_row(name, email, item, qty, total="", notes="", city=""):
+    """
+    Builds a single raw order row with blank address fields
+    """
+    row = {
+        'Name': name,
+        'Email': email,
+        'Total': total,
+        'Notes': notes,
+        'Lineitem quantity': qty,
+        'Lineitem price': "1.00",
+        'Lineitem name': item
+    }
+    for col in OrderCompressor.BILLING_COLUMNS + OrderCompressor.SHIPPING_COLUMNS:
+        row[col] = ""
+    row['Shipping City'] = city
+    return row
+
+def compress(rows, had_fortnightly_coffee=dict()):
+    compressor = OrderCompressor(dt.datetime(2021, 1, 23),
+                                 OrderProcessor._is_fortnightly_coffee)
+    stock, compressed_rows = compressor.compress(pd.DataFrame(rows, dtype=str),
+                                                 had_fortnightly_coffee)
+    return Lineitems.stock_to_dict(stock, compressor.skus), compressed_rows
+
+def test_compress_orders():
+    """
+    Tests that lineitem rows are compressed into a single row per order
+    """
+    rows = [
+        make_row("#1002", "b@test.com", "Extra Loaf", "1", total="12.50", city="London"),
+        make_row("#1001", "a@test.com", "Granola", "2", total="5.00"),
+        make_row("#1002", "", "Granola", "1", notes="Ring bell", city="  "),
+        make_row("#1002", "", "Extra Loaf", "2", notes="  "),
+    ]
+
+    total_items, compressed_rows = compress(rows)
+
+    assert list(total_items.items()) == [("Extra Loaf", 3), ("Granola", 3)]
+    assert [r['ID'] for r in compressed_rows] == [1002, 1001]
+
+    order = compressed_rows[0]
+    assert order['Email'] == "b@test.com"
+    assert order['DeliveryDate'] == "2021-01-23"
+    assert order['Lineitems'] == "Extra Loaf|Extra Loaf|Extra Loaf|Granola"
+    assert order['ShippingAddress'] == "London"
+    assert order['BillingAddress'] == ""
+    assert order['Total'] == 12.5
+    assert order['DeliveryNotes'] == "Ring bell"
+
+    assert compressed_rows[1]['Lineitems'] == "Granola|Granola"
+    assert compressed_rows[1]['DeliveryNotes'] == "N/A"
+
+def test_compress_orders_stock_order():
+    """
+    Tests that stock is listed in the order items first appear in the
+    orders rather than in SKU order
+    """
+    rows = [
+        make_row("#1001", "a@test.com", "Mystery Box", "1"),
+        make_row("#1002", "b@test.com", "Granola", "1"),
+        make_row("#1001", "", "Extra Loaf", "2"),
+        make_row("#1002", "", "Mystery Box", "1"),
+    ]
+
+    total_items, _ = compress(rows)
+
+    assert list(total_items.items()) == [("Mystery Box", 2), ("Extra Loaf", 2), ("Granola", 1)]
+
+def test_compress_skips_repeat_fortnightly_coffee():
+    """
+    Tests fortnightly coffee is dropped for customers that had it in
+    their last order
+    """
+    rows = [
+        make_row("#1", "a@test.com", FORTNIGHTLY, "1", total="10"),
+        make_row("#2", "b@test.com", FORTNIGHTLY, "1", total="10"),
+    ]
+
+    total_items, compressed_rows = compress(rows, {"a@test.com": True})
+
+    assert total_items == {FORTNIGHTLY: 1}
+    assert compressed_rows[0]['Lineitems'] == ""
+    assert compressed_rows[1]['Lineitems'] == FORTNIGHTLY
+
+def test_compress_stock_by_SKU():
+    """
+    Tests stock is counted per SKU, including unmatched items
+    """
+    rows = [
+        make_row("#1", "a@test.com", "Granola", "2"),
+        make_row("#2", "b@test.com", "Mystery Box", "1"),
+        make_row("#2", "", "Granola", "1"),
+    ]
+
+    compressor = OrderCompressor(dt.datetime(2021, 1, 23),
+                                 OrderProcessor._is_fortnightly_coffee)
+    stock, _ = compressor.compress(pd.DataFrame(rows, dtype=str), dict())
+
+    assert stock[Lineitems.Granola.SKU] == 3
+    assert stock[compressor.skus.sku(Lineitems.get("Mystery Box"))] == 1
+    assert stock.sum() == 4
+
@@ -1,5 +1,5 @@
 
-from ButterAndCrust.lib.items.OrderItems import Lineitems, _BaseItem, _BaseFriendlyItem
+from ButterAndCrust.lib.items.OrderItems import Lineitems, SkuMap, _BaseItem, _BaseFriendlyItem
 
 def test_BaseItem_init():
     """
@@ -76,3 +76,57 @@ def test_order_image():
     item = Lineitems.get(desc)
     assert item.img.endswith("ExtraLoaf_logo.png")
 
+
+def test_get_normalised():
+    """
+    Tests that descriptions are matched ignoring case and whitespace
+    """
+    assert type(Lineitems.get("  extra   LOAF ")) is Lineitems.ExtraLoaf
+
+def test_unmatched_item_interned():
+    """
+    Tests that repeats of an unmatched description reuse one item
+    """
+    assert Lineitems.get("Not a real item") is Lineitems.get("Not a real item")
+
+def test_item_attributes():
+    """
+    Tests the attributes parsed from item descriptions
+    """
+    item = Lineitems.get("Monmouth Coffee. - Espresso / Fine / 250g every other week")
+
+    assert item.product == "Monmouth Coffee."
+    assert item.roast == "Espresso"
+    assert item.grind == "Fine"
+    assert item.cadence == "every other week"
+    assert item.is_coffee and item.is_fortnightly and not item.is_subscription
+
+    assert not Lineitems.get("Monmouth Coffee. - Espresso / Fine / 250g per week").is_fortnightly
+    assert Lineitems.get("New Coffee - House / Coarse / 250g every fortnight").is_fortnightly
+    assert Lineitems.get("Butter & Crust Subscription (Loaf Included)").is_subscription
+
+    loaf = Lineitems.get("Extra Loaf")
+    assert loaf.product == "Extra Loaf"
+    assert loaf.roast is None and not loaf.is_coffee
+
+def test_fallback_skus_are_per_run():
+    """
+    Tests that unmatched items only get SKUs in the SkuMap of a run, so
+    looking up many unmatched descriptions doesn't grow the catalog
+    """
+    num_skus = Lineitems.num_skus()
+
+    for i in range(3000):
+        Lineitems.get("Unmatched item {}".format(i))
+
+    assert Lineitems.num_skus() == num_skus
+
+    skus = SkuMap()
+    mystery = skus.sku(Lineitems.get("Mystery Box"))
+
+    assert mystery == skus.sku(Lineitems.get("Mystery Box"))
+    assert skus.sku(Lineitems.get("Granola")) == Lineitems.Granola.SKU
+    assert skus.by_sku(mystery).description == "Mystery Box"
+    assert mystery == num_skus
+    assert len(skus) == num_skus + 1
+    assert len(SkuMap()) == num_skus
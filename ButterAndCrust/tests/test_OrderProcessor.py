@@ -0,0 +1,109 @@
+import pandas as pd
+
+import ButterAndCrust.lib.OrderProcessor as OP
+from ButterAndCrust.lib.OrderProcessor import OrderProcessor
+from ButterAndCrust.lib.OrderCompressor import OrderCompressor
+
+def test_fortnightly_coffee_index():
+    """
+    Tests the previous order index matches customers by exact email
+    """
+    processor = OrderProcessor("", "2021/01/23", None)
+
+    prev_orders = pd.DataFrame({
+        'Email': ["ann@test.com", "joann@test.com", "bob@test.com"],
+        'Lineitems': [
+            "Extra Loaf",
+            "Monmouth Coffee. - Classic / Wholebean / 250g every other week|Extra Loaf",
+            "Monmouth Coffee. - Classic / Wholebean / 250g per week"
+        ]
+    })
+
+    index = processor._fortnightly_coffee_index(prev_orders)
+
+    assert not index["ann@test.com"]
+    assert index["joann@test.com"]
+    assert not index["bob@test.com"]
+
+def test_fortnightly_coffee_index_empty():
+    """
+    Tests an empty index is built when there are no previous orders
+    """
+    processor = OrderProcessor("", "2021/01/23", None)
+
+    assert processor._fortnightly_coffee_index(pd.DataFrame()) == dict()
+
+class MockOrderTable():
+    """
+    Minimal in memory stand in for a CompressedOrderHistory table
+    """
+    def __init__(self):
+        self.batches = []
+
+    def get_max(self, col_name):
+        return None
+
+    def get_most_recent_order_by_email(self, current_date):
+        return pd.DataFrame()
+
+    def sync_by_ID(self, records):
+        self.batches.append(records)
+
+def write_orders(infile):
+    """
+    Writes a raw orders csv of 7 orders with 1 to 3 lineitems each
+    """
+    rows = []
+    for orderID in range(1, 8):
+        for item in ["Extra Loaf", "Granola", "Preserves 125g"][:orderID % 3 + 1]:
+            rows.append({
+                'Name': "#" + str(orderID),
+                'Email': "customer{}@test.com".format(orderID),
+                'Total': "10.0",
+                'Notes': "",
+                'Lineitem quantity': "1",
+                'Lineitem name': item
+            })
+    columns = ['Name', 'Email', 'Total', 'Notes', 'Lineitem quantity', 'Lineitem name']
+    columns += OrderCompressor.BILLING_COLUMNS + OrderCompressor.SHIPPING_COLUMNS
+
+    pd.DataFrame(rows, columns=columns).fillna("").to_csv(infile, index=False)
+
+def test_process_orders_streaming(tmp_path):
+    """
+    Tests that streaming the input in chunks gives the same result as
+    reading it all at once, with orders split across chunk boundaries
+    """
+    infile = str(tmp_path / "orders.csv")
+    write_orders(infile)
+
+    expected_table = MockOrderTable()
+    processor = OrderProcessor(infile, "2021/01/23", expected_table)
+    processor._testing = True
+    expected = processor.process_orders(str(tmp_path / "expected.csv"))
+
+    actual_table = MockOrderTable()
+    processor = OrderProcessor(infile, "2021/01/23", actual_table)
+    processor._testing = True
+    actual = processor.process_orders(str(tmp_path / "actual.csv"),
+                                      chunksize=4, batch_size=3)
+
+    assert actual == expected
+    assert [len(batch) for batch in actual_table.batches] == [3, 3, 1]
+    assert sum(actual_table.batches, []) == expected_table.batches[0]
+
+def test_process_orders_streaming_default_batch_size(tmp_path, monkeypatch):
+    """
+    Tests that streamed orders are synced in bounded batches when no
+    batch size is given
+    """
+    infile = str(tmp_path / "orders.csv")
+    write_orders(infile)
+    monkeypatch.setattr(OP, "DEFAULT_BATCH_SIZE", 2)
+
+    table = MockOrderTable()
+    processor = OrderProcessor(infile, "2021/01/23", table)
+    processor._testing = True
+    processor.process_orders(str(tmp_path / "stock.csv"), chunksize=4)
+
+    assert [len(batch) for batch in table.batches] == [2, 2, 2, 1]
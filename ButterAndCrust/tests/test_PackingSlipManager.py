@@ -0,0 +1,237 @@
+import datetime as dt
+import threading
+import pandas as pd
+
+from ButterAndCrust.lib.PackingSlipManager import PackingSlipManager
+from ButterAndCrust.lib.PackingSlipCache import PackingSlipCache
+
+class MockOrderTable():
+    """
+    Minimal in memory stand in for a CompressedOrderHistory table
+    """
+    def __init__(self, orders):
+        self.orders = orders
+
+    def get_all_by_delivery_date(self, start_date, end_date):
+        return self.orders
+
+def make_orders(IDs):
+    return pd.DataFrame({
+        'ID': IDs,
+        'Email': ["customer@test.com"] * len(IDs),
+        'DeliveryDate': [dt.datetime(2021, 1, 23)] * len(IDs),
+        'Lineitems': ["Extra Loaf|Granola"] * len(IDs),
+        'BillingAddress': [""] * len(IDs),
+        'ShippingAddress': [""] * len(IDs),
+        'Total': [10.0] * len(IDs),
+        'DeliveryNotes': ["N/A"] * len(IDs)
+    })
+
+def test_produce_packing_slips(tmp_path):
+    """
+    Tests that packing slips are rendered in memory, in the order of
+    deliveries, in chunks of a single route and stop range
+    """
+    routes_file = str(tmp_path / "routes.csv")
+    pd.DataFrame({
+        'Order_Number': [1, 2, 3],
+        'Tracking_ID': [1, 2, 3],
+        'Rider': ["Route B", "Route A", "Route A"],
+        'Stop on Route': [1, 12, 3]
+    }).to_csv(routes_file, index=False)
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID} {lineitems}", "",
+                                 slips_per_pdf=2)
+
+    rendered = []
+    manager.render_html_to_pdf = lambda slips, outfile: rendered.append((slips, outfile))
+
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file,
+                                  MockOrderTable(make_orders([1, 2, 3])))
+
+    rendered.sort(key=lambda job: job[1])
+    assert [outfile for _, outfile in rendered] == [
+        str(tmp_path / "PackingSlips_{}.pdf".format(i)) for i in range(3)
+    ]
+
+    # stops 3 and 12 of Route A fall in different stop ranges
+    assert [[slip.split()[0] for slip in chunk] for chunk, _ in rendered] == [["#3"], ["#2"], ["#1"]]
+
+    slips = [slip for chunk, _ in rendered for slip in chunk]
+    assert "Granola" in slips[0]
+    assert not list(tmp_path.glob("*.html"))
+
+def test_produce_packing_slips_in_parallel(tmp_path):
+    """
+    Tests that pdfs are rendered concurrently and keep their names
+    """
+    routes_file = str(tmp_path / "routes.csv")
+    pd.DataFrame({
+        'Order_Number': range(1, 9),
+        'Tracking_ID': range(1, 9),
+        'Rider': ["Route A"] * 8,
+        'Stop on Route': range(1, 9)
+    }).to_csv(routes_file, index=False)
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID}", "",
+                                 slips_per_pdf=2, max_workers=4)
+
+    lock = threading.Lock()
+    barrier = threading.Barrier(4, timeout=5)
+    rendered = dict()
+
+    def render(slips, outfile):
+        # every chunk must be in flight at once to pass the barrier
+        barrier.wait()
+        with lock:
+            rendered[outfile] = slips
+
+    manager.render_html_to_pdf = render
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file,
+                                  MockOrderTable(make_orders(list(range(1, 9)))))
+
+    assert rendered == {
+        str(tmp_path / "PackingSlips_{}.pdf".format(i)): ["#{}".format(2 * i + 1), "#{}".format(2 * i + 2)]
+        for i in range(4)
+    }
+
+
+def test_route_order_warnings(tmp_path, monkeypatch):
+    """
+    Tests that missing, duplicated and unreadable route rows are each 
+    reported in a single warning
+    """
+    routes_file = str(tmp_path / "routes.csv")
+    pd.DataFrame({
+        'Order_Number': [1, 1, 2, 3, 5, 5],
+        'Rider': ["Route A", "Route B", "Route A", "Route A", "Route B", "Route B"],
+        'Stop on Route': ["2", "1", "?", "3", "1", "2"]
+    }).to_csv(routes_file, index=False)
+
+    warnings = []
+    monkeypatch.setattr("ButterAndCrust.lib.General.Exceptions.throw_warning", warnings.append)
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID} {stopnumber}", "")
+    slips = manager.build_packing_slips(dt.datetime(2021, 1, 23), routes_file,
+                                        MockOrderTable(make_orders([1, 2, 3, 4, 5, 6])))
+
+    assert len(warnings) == 3
+    assert "#4, #6" in warnings[0]
+    assert "#1 (2 rows), #5 (2 rows)" in warnings[1]
+    assert "#2 (?)" in warnings[2]
+
+    assert [slip[:2] for slip in slips] == [
+        ("", 4), ("", 6), ("Route A", 1), ("Route A", 2), ("Route A", 3), ("Route B", 1)
+    ]
+    assert slips[3][2] == "#1 02"
+
+def test_produce_packing_slips_long_route(tmp_path):
+    """
+    Tests that stops past 99 are sorted and chunked as numbers
+    """
+    routes_file = str(tmp_path / "routes.csv")
+    pd.DataFrame({
+        'Order_Number': [1, 2, 3, 4, 5],
+        'Rider': ["Route A"] * 5,
+        'Stop on Route': [2, 100, 11, 12, 9]
+    }).to_csv(routes_file, index=False)
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID} {stopnumber}", "",
+                                 slips_per_pdf=10, max_workers=1)
+
+    rendered = []
+    manager.render_html_to_pdf = lambda slips, outfile: rendered.append((outfile, slips))
+
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file,
+                                  MockOrderTable(make_orders([1, 2, 3, 4, 5])))
+
+    assert sorted(rendered) == [
+        (str(tmp_path / "PackingSlips_0.pdf"), ["#1 02", "#5 09"]),
+        (str(tmp_path / "PackingSlips_1.pdf"), ["#3 11", "#4 12"]),
+        (str(tmp_path / "PackingSlips_2.pdf"), ["#2 100"]),
+    ]
+
+def test_produce_packing_slips_cached(tmp_path):
+    """
+    Tests that a re-run only renders the pdfs whose packing slips have
+    changed and copies the rest from the cache
+    """
+    routes_file = str(tmp_path / "routes.csv")
+    pd.DataFrame({
+        'Order_Number': range(1, 5),
+        'Rider': ["Route A"] * 4,
+        'Stop on Route': range(1, 5)
+    }).to_csv(routes_file, index=False)
+
+    rendered = []
+
+    def render(slips, outfile):
+        rendered.append(outfile)
+        with open(outfile, "w") as pdf:
+            pdf.write("|".join(slips))
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID} {ordernotes}", "",
+                                 slips_per_pdf=2, max_workers=1,
+                                 cache=PackingSlipCache(str(tmp_path / "cache")))
+    manager.render_html_to_pdf = render
+
+    orders = make_orders([1, 2, 3, 4])
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file, MockOrderTable(orders))
+    assert len(rendered) == 2
+
+    # change the notes of order 4 only
+    orders.loc[3, 'DeliveryNotes'] = "Ring bell"
+    (tmp_path / "PackingSlips_0.pdf").unlink()
+    rendered.clear()
+
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file, MockOrderTable(orders))
+
+    assert rendered == [str(tmp_path / "PackingSlips_1.pdf")]
+    assert (tmp_path / "PackingSlips_0.pdf").read_text() == "#1 N/A|#2 N/A"
+    assert (tmp_path / "PackingSlips_1.pdf").read_text() == "#3 N/A|#4 Ring bell"
+
+def test_produce_packing_slips_cached_route_changes(tmp_path):
+    """
+    Tests that moving an order to another route, or adding an order,
+    only re-renders the pdfs of the routes it is in
+    """
+    routes_file = str(tmp_path / "routes.csv")
+
+    def write_routes(routes):
+        pd.DataFrame({
+            'Order_Number': [ID for ID, _, _ in routes],
+            'Rider': [route for _, route, _ in routes],
+            'Stop on Route': [stop for _, _, stop in routes]
+        }).to_csv(routes_file, index=False)
+
+    rendered = []
+
+    def render(slips, outfile):
+        rendered.append(slips)
+        with open(outfile, "w") as pdf:
+            pdf.write("|".join(slips))
+
+    manager = PackingSlipManager(str(tmp_path / "PackingSlips"), "#{orderID}", "",
+                                 slips_per_pdf=2, max_workers=1,
+                                 cache=PackingSlipCache(str(tmp_path / "cache")))
+    manager.render_html_to_pdf = render
+
+    routes = [(ID, "Route A", ID) for ID in range(1, 5)] + [(ID, "Route B", ID - 4) for ID in range(5, 9)]
+    write_routes(routes)
+    orders = MockOrderTable(make_orders(list(range(1, 9))))
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file, orders)
+    assert len(rendered) == 4
+
+    # order 4 is moved to the end of Route B
+    routes[3] = (4, "Route B", 5)
+    write_routes(routes)
+    rendered.clear()
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file, orders)
+    assert sorted(rendered) == [["#3"], ["#4"]]
+
+    # order 9 is added to the end of Route A
+    write_routes(routes + [(9, "Route A", 4)])
+    orders = MockOrderTable(make_orders(list(range(1, 10))))
+    rendered.clear()
+    manager.produce_packing_slips(dt.datetime(2021, 1, 23), routes_file, orders)
+    assert rendered == [["#3", "#9"]]
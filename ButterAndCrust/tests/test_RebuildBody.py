@@ -0,0 +1,90 @@
+import datetime as dt
+
+import pytest
+
+from ButterAndCrust.ConsoleScripts.RebuildBody import rebuild_body, ArchiveChecksumError, ARCHIVE_WATERMARK_KEY
+from ButterAndCrust.lib.DB.Tables.Metadata import sqlMetadata
+from ButterAndCrust.tests.fake_airtable import FakeAirtable
+from ButterAndCrust.tests.test_CompressedOrderHistory import make_record, make_table, make_airtable
+
+def test_rebuild_body(tmp_path):
+    """
+    Tests that only records older than the cutoff are moved to cold 
+    storage and deleted from the head table
+    """
+    fake = FakeAirtable()
+    head = make_airtable(fake)
+    body = make_table(tmp_path, profile='archive')
+    fake.add_records(head.name, [
+        make_record(1, date="2021-01-02"),
+        make_record(2, date="2021-01-09"),
+        make_record(3, date="2021-02-06")
+    ])
+
+    moved = rebuild_body(body, head, date=dt.datetime(2021, 2, 6), cutoff=21)
+
+    assert moved == 2
+    assert sorted(body.select()['ID']) == [1, 2]
+    assert [r['fields']['ID'] for r in fake.tables[head.name]] == [3]
+    assert sqlMetadata(body.db_file).get(ARCHIVE_WATERMARK_KEY) == "2021-01-16"
+
+def test_rebuild_body_before_watermark(tmp_path):
+    """
+    Tests that head records delivered before an existing watermark,
+    e.g. late synced orders, are still archived and that the watermark
+    is never moved back
+    """
+    fake = FakeAirtable()
+    head = make_airtable(fake)
+    body = make_table(tmp_path, profile='archive')
+    sqlMetadata(body.db_file).set(ARCHIVE_WATERMARK_KEY, "2021-01-16")
+
+    assert rebuild_body(body, head, date=dt.datetime(2021, 2, 6), cutoff=21) == 0
+
+    fake.add_records(head.name, [
+        make_record(1, date="2021-01-02"),
+        make_record(2, date="2021-01-16"),
+        make_record(3, date="2021-02-06")
+    ])
+
+    assert rebuild_body(body, head, date=dt.datetime(2021, 2, 6), cutoff=28) == 1
+    assert body.select()['ID'].tolist() == [1]
+    assert sqlMetadata(body.db_file).get(ARCHIVE_WATERMARK_KEY) == "2021-01-16"
+
+    assert rebuild_body(body, head, date=dt.datetime(2021, 2, 13), cutoff=21) == 1
+    assert sorted(body.select()['ID']) == [1, 2]
+    assert [r['fields']['ID'] for r in fake.tables[head.name]] == [3]
+    assert sqlMetadata(body.db_file).get(ARCHIVE_WATERMARK_KEY) == "2021-01-23"
+
+def test_rebuild_body_checksum_mismatch(tmp_path, monkeypatch):
+    """
+    Tests that nothing is deleted from the head table when the records
+    don't arrive in cold storage
+    """
+    fake = FakeAirtable()
+    head = make_airtable(fake)
+    body = make_table(tmp_path, profile='archive')
+    fake.add_records(head.name, [make_record(1, date="2021-01-02")])
+
+    monkeypatch.setattr(body, "sync_by_ID", lambda records: None)
+
+    with pytest.raises(ArchiveChecksumError):
+        rebuild_body(body, head, date=dt.datetime(2021, 2, 6), cutoff=21)
+
+    assert len(fake.tables[head.name]) == 1
+    assert sqlMetadata(body.db_file).get(ARCHIVE_WATERMARK_KEY) is None
+
+def test_rebuild_body_requires_durable_body(tmp_path):
+    """
+    Tests that nothing is archived into cold storage that doesn't sync
+    its commits to disk
+    """
+    fake = FakeAirtable()
+    head = make_airtable(fake)
+    body = make_table(tmp_path, profile='bulk_load')
+    fake.add_records(head.name, [make_record(1, date="2021-01-02")])
+
+    with pytest.raises(ValueError):
+        rebuild_body(body, head, date=dt.datetime(2021, 2, 6), cutoff=21)
+
+    assert len(fake.tables[head.name]) == 1
@@ -0,0 +1,97 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from ButterAndCrust.lib.DB.RequestScheduler import RequestScheduler
+from ButterAndCrust.lib.DB.Tables.CompressedOrderHistory import airCompressedOrderHistory
+from ButterAndCrust.tests.fake_airtable import FakeAirtable, FakeAirtableServer
+
+def make_airtable(server, scheduler):
+    """
+    Creates an airCompressedOrderHistory talking to a fake http server
+    """
+    table = airCompressedOrderHistory("appTEST", "keyTEST")
+    table.url_table = server.table_url("appTEST", table.name)
+    table.scheduler = scheduler
+    return table
+
+def test_rate_limit():
+    """
+    Tests requests are paced by the token bucket
+    """
+    scheduler = RequestScheduler(rate=50, burst=1)
+
+    start = time.monotonic()
+    for _ in range(11):
+        scheduler.submit(lambda: None)
+    elapsed = time.monotonic() - start
+
+    assert elapsed >= 0.18
+    assert scheduler.stats['requests'] == 11
+    assert scheduler.stats['wait_time'] > 0
+
+def test_max_concurrent():
+    """
+    Tests no more than max_concurrent requests run at once
+    """
+    scheduler = RequestScheduler(rate=1000, burst=1000, max_concurrent=2)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+
+    def request(_):
+        def call():
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+            time.sleep(0.02)
+            with lock:
+                active[0] -= 1
+        return scheduler.submit(call)
+
+    scheduler.map(request, range(8))
+
+    assert peak[0] == 2
+
+def test_retries_against_fake_server():
+    """
+    Tests 429 and 5xx responses from the server are retried
+    """
+    fake = FakeAirtable()
+    scheduler = RequestScheduler(rate=1000, burst=1000, backoff=0.01)
+
+    with FakeAirtableServer(fake) as server:
+        table = make_airtable(server, scheduler)
+        table.batch_insert([{"ID": i} for i in range(25)])
+
+        fake.failures = [429, 503]
+        records = table.get_all()
+
+    assert len(records) == 25
+    assert scheduler.stats['retries'] == 2
+    assert scheduler.stats['requests'] == 3 + 3
+
+def test_gives_up_after_max_retries():
+    """
+    Tests the error is raised once max_retries is exhausted
+    """
+    fake = FakeAirtable()
+    scheduler = RequestScheduler(rate=1000, burst=1000, backoff=0.01, max_retries=2)
+
+    with FakeAirtableServer(fake) as server:
+        table = make_airtable(server, scheduler)
+        fake.failures = [500, 500, 500, 500]
+
+        with pytest.raises(requests.exceptions.HTTPError):
+            table.get_all()
+
+    assert scheduler.stats['retries'] == 2
+
+def test_shared_per_key():
+    """
+    Tests tables on the same base share a scheduler
+    """
+    assert RequestScheduler.shared("appA") is RequestScheduler.shared("appA")
+    assert RequestScheduler.shared("appA") is not RequestScheduler.shared("appB")
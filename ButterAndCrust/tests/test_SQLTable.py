@@ -1,6 +1,9 @@
 import os
+import sqlite3
 
-from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable
+import pytest
+
+from ButterAndCrust.lib.DB.Tables.SQLTable import SQLTable, build_statement
 
 DB_LOC = os.path.dirname(__file__) + "/mockdata/OrderHistory.db"
 
@@ -8,4 +11,118 @@ def test_init():
     table = SQLTable("TempTable", ["ID"], DB_LOC)
 
     assert table.name == "TempTable"
-    assert table.columns == ["ID"]
\ No newline at end of file
+    assert table.columns == ["ID"]
+
+def make_table(tmp_path):
+    """
+    Creates a fresh table in a temporary database
+    """
+    table = SQLTable("Orders", ["ID", "Email"], str(tmp_path / "test.db"))
+    table._execute("CREATE TABLE Orders(ID INTEGER NOT NULL, Email TEXT NOT NULL)")
+    return table
+
+def test_insert_many(tmp_path):
+    """
+    Tests that insert_many writes every row across several batches
+    """
+    table = make_table(tmp_path)
+    rows = [{"ID": i, "Email": "{}@test.com".format(i)} for i in range(25)]
+
+    table.insert_many(rows, batch_size=10)
+
+    df = table.select()
+    assert df['ID'].tolist() == list(range(25))
+    assert df['Email'].iloc[3] == "3@test.com"
+
+def test_insert_many_rolls_back_failed_batch(tmp_path):
+    """
+    Tests that a failing batch is rolled back as a single transaction
+    """
+    table = make_table(tmp_path)
+    rows = [{"ID": 1, "Email": "a"}, {"ID": 2, "Email": None}]
+
+    with pytest.raises(sqlite3.IntegrityError):
+        table.insert_many(rows)
+
+    assert table.select().empty
+
+def test_delete_binds_params(tmp_path):
+    """
+    Tests that delete only removes the rows matching its where clause
+    """
+    table = make_table(tmp_path)
+    table.insert_many([{"ID": i, "Email": "{}@test.com".format(i)} for i in range(5)])
+
+    table.delete(where="ID >= ?", params=(3,))
+
+    assert table.select()['ID'].tolist() == [0, 1, 2]
+
+    table.delete()
+
+    assert table.select().empty
+
+def test_max_min_bind_params(tmp_path):
+    """
+    Tests that max and min filter with bound parameters
+    """
+    table = make_table(tmp_path)
+    table.insert_many([{"ID": i, "Email": "{}@test.com".format(i % 2)} for i in range(10)])
+
+    assert table.max("ID") == 9
+    assert table.min("ID") == 0
+    assert table.max("ID", where="Email = ?", params=("0@test.com",)) == 8
+    assert table.min("ID", where="Email = ?", params=("1@test.com",)) == 1
+
+def test_select_values_are_not_interpolated(tmp_path):
+    """
+    Tests that values are bound rather than formatted into the sql, so
+    quotes in values are harmless
+    """
+    table = make_table(tmp_path)
+    table.insert_many([{"ID": 1, "Email": "o'brien@test.com"}])
+
+    df = table.select(columns=["ID"], where="Email = ?", params=("o'brien@test.com",))
+
+    assert df['ID'].tolist() == [1]
+
+def test_build_statement_is_cached():
+    """
+    Tests that a repeated query reuses the same statement text
+    """
+    first = build_statement("SELECT", "Orders", ("ID",), "Email = ?")
+    hits = build_statement.cache_info().hits
+    second = build_statement("SELECT", "Orders", ("ID",), "Email = ?")
+
+    assert first is second
+    assert build_statement.cache_info().hits == hits + 1
+    assert first == "SELECT ID FROM Orders WHERE Email = ?"
+
+def test_iter_chunks(tmp_path):
+    """
+    Tests that streamed chunks hold every row in order and that an
+    empty result still gives its columns
+    """
+    table = make_table(tmp_path)
+    table.insert_many([{"ID": i, "Email": "{}@test.com".format(i)} for i in range(25)])
+
+    chunks = list(table.select_chunks(where="ID >= ?", params=(5,), chunksize=10))
+
+    assert [len(df) for df in chunks] == [10, 10]
+    assert sum((df['ID'].tolist() for df in chunks), []) == list(range(5, 25))
+
+    chunks = list(table.select_chunks(columns=["Email"], where="ID < ?", params=(0,)))
+
+    assert len(chunks) == 1
+    assert chunks[0].empty
+    assert chunks[0].columns.tolist() == ["Email"]
+
+def test_iter_rows(tmp_path):
+    """
+    Tests that iter_rows streams every row as a tuple
+    """
+    table = make_table(tmp_path)
+    table.insert_many([{"ID": i, "Email": "{}@test.com".format(i)} for i in range(7)])
+
+    rows = list(table.iter_rows("SELECT ID, Email FROM Orders ORDER BY ID", size=3))
+
+    assert rows == [(i, "{}@test.com".format(i)) for i in range(7)]